@@ -1,13 +1,34 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from django.utils import timezone
 from django.utils.html import format_html
 
 from .models import (
+    ROLLUP_STATUS_CHOICES,
     CustomUser,
+    CustomerOrderSummary,
+    DailyProductSales,
+    DailySales,
     Address,
     Category,
     Product,
+    ProductVariant,
     Review,
+    ShippingRate,
+    StockMovement,
+    StockSnapshot,
     Transaction,
     Cart,
     CartItem,
@@ -19,14 +40,63 @@ from .models import (
     # DiscountCode,
     OrderItem,
     LookbookImage,
+    OutboundEmail,
+    StockReservation,
+    WebhookEvent,
+    WebhookJournalEntry,
 )
+from .catalog import CatalogError, import_catalog, read_catalog
+from .exports import FORMATS, export_rows
+from .forms import CatalogUploadForm
+from .ledger import current_levels, record_changes
+from .orders import decline_transaction, fulfil_transactions
+from .rollups import rebuild_rollups
+from .summaries import rebuild_summaries
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large changelists. Counts exactly only up to
+    ``exact_limit`` rows; past that an unfiltered list uses the table's
+    estimated size and a filtered one stops at the limit, instead of running
+    COUNT(*) over the whole table on every page view.
+    """
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        counted = queryset.order_by()[:self.exact_limit + 1].count()
+        if counted <= self.exact_limit:
+            return counted
+        if queryset.query.where:
+            return self.exact_limit
+        return max(estimated_row_count(queryset.model), self.exact_limit)
+
+
+def _order_dates(transactions):
+    return sorted(set(
+        transactions.order_by().annotate(day=TruncDate('transaction_date')).values_list('day', flat=True)
+    ))
+
+
+def estimated_row_count(model):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    # The highest id is an index lookup and close enough for page links
+    return model._default_manager.aggregate(highest=Max('pk'))['highest'] or 0
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = (
-        'username', 'email', 'first_name', 'last_name', 'is_staff',
+        'username', 'email', 'first_name', 'last_name', 'is_staff', 'order_count', 'lifetime_spend',
     )
+    list_select_related = ('order_summary',)
     list_filter = (
         'is_staff', 'is_active',
     )
@@ -45,10 +115,34 @@ class CustomUserAdmin(UserAdmin):
         )}),
     )
 
+    def _summary(self, obj):
+        return getattr(obj, 'order_summary', None)
+
+    def order_count(self, obj):
+        summary = self._summary(obj)
+        return summary.total_orders() if summary else 0
+    order_count.short_description = "Orders"
+
+    def lifetime_spend(self, obj):
+        summary = self._summary(obj)
+        return summary.lifetime_spend if summary else 0
+    lifetime_spend.short_description = "Lifetime spend"
+    lifetime_spend.admin_order_field = 'order_summary__lifetime_spend'
+
 @admin.register(Address)
 class AddressAdmin(admin.ModelAdmin):
-    list_display = ('street', 'city', 'state', 'postal_code', 'country')
-    search_fields = ('street', 'city', 'state', 'postal_code', 'country')
+    list_display = ('full_name', 'street', 'city', 'state', 'postal_code', 'country', 'shipping_zone')
+    list_filter = ('shipping_zone',)
+    # Names, cities, postcodes and phones match by prefix (the NOCASE indexes
+    # cover name and city); street, state and country still match anywhere
+    search_fields = ('^full_name', '^city', '^postal_code', '^phone_number', 'street', 'state', 'country')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(ShippingRate)
+class ShippingRateAdmin(admin.ModelAdmin):
+    list_display = ('zone', 'fee')
+    list_editable = ('fee',)
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -64,47 +158,244 @@ class ReviewAdmin(admin.ModelAdmin):
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ('tx_ref', 'user', 'amount', 'transaction_status', 'transaction_date', 'flw_transaction_id', 'address')
+    list_display = ('tx_ref', 'customer', 'amount', 'transaction_status', 'transaction_date', 'flw_transaction_id', 'item_count', 'shipping_zone')
     list_filter = ('transaction_status', 'transaction_date')
-    search_fields = ('tx_ref', 'user__username', 'flw_transaction_id')
-    actions = ['approve_transactions', 'decline_transactions']
+    search_fields = ('=tx_ref', '=flw_transaction_id', '^user__username')
+    list_select_related = ('user', 'address')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['approve_transactions', 'decline_transactions', 'export_csv', 'export_jsonl']
+
+    def get_queryset(self, request):
+        item_count = OrderItem.objects.filter(transaction=OuterRef('pk')).values('transaction').annotate(
+            total=Sum('quantity'),
+        ).values('total')
+        return super().get_queryset(request).annotate(items=Subquery(item_count))
+
+    def customer(self, obj):
+        return obj.user.username if obj.user else None
+    customer.admin_order_field = 'user__username'
+
+    def item_count(self, obj):
+        return obj.items or 0
+    item_count.short_description = "Items"
+    item_count.admin_order_field = 'items'
+
+    def shipping_zone(self, obj):
+        return obj.address.shipping_zone if obj.address else None
+    shipping_zone.short_description = "Zone"
+    shipping_zone.admin_order_field = 'address__shipping_zone'
 
     def approve_transactions(self, request, queryset):
-        queryset.update(transaction_status='approved')
-        self.message_user(request, "Selected transactions have been approved.")
-    approve_transactions.short_description = "Approve selected transactions"
+        # Same pipeline as a paid webhook: stock, order lines, cart, emails
+        outcomes = fulfil_transactions(queryset)
+        by_outcome = {}
+        for transaction, outcome in outcomes.items():
+            by_outcome.setdefault(outcome, []).append(transaction.tx_ref)
+        approved = by_outcome.pop('approved', [])
+        if approved:
+            self.message_user(request, f"Approved and fulfilled {len(approved)} transaction(s).", messages.SUCCESS)
+        declined = by_outcome.pop('insufficient stock', [])
+        if declined:
+            self.message_user(
+                request,
+                f"Declined {len(declined)} transaction(s) for insufficient stock: {', '.join(declined)}",
+                messages.ERROR,
+            )
+        for outcome, tx_refs in by_outcome.items():
+            self.message_user(request, f"Skipped, {outcome}: {', '.join(tx_refs)}", messages.WARNING)
+    approve_transactions.short_description = "Approve and fulfil selected transactions"
 
     def decline_transactions(self, request, queryset):
-        queryset.update(transaction_status='declined')
-        self.message_user(request, "Selected transactions have been declined.")
+        # Through decline_transaction so holds are released and the ledger, summaries and rollups follow
+        declined, skipped = [], []
+        for transaction in queryset.select_related('user'):
+            if decline_transaction(transaction, notify=True):
+                declined.append(transaction.tx_ref)
+            else:
+                skipped.append(f"{transaction.tx_ref} ({transaction.transaction_status})")
+        if declined:
+            self.message_user(request, f"Declined {len(declined)} transaction(s).", messages.SUCCESS)
+        if skipped:
+            # Approved orders have had their stock taken; declining them here would not put it back
+            self.message_user(
+                request, f"Skipped, no longer open: {', '.join(skipped)}", messages.WARNING,
+            )
     decline_transactions.short_description = "Decline selected transactions"
 
+    def _export(self, queryset, format):
+        lines, content_type = FORMATS[format]
+        # Without the changelist's annotations, which the export doesn't need
+        transactions = Transaction.objects.filter(pk__in=queryset.values('pk'))
+        response = StreamingHttpResponse(lines(export_rows(transactions)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders-{timezone.now():%Y%m%d-%H%M}.{format}"'
+        return response
+
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv')
+    export_csv.short_description = "Export selected transactions and lines (CSV)"
+
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, 'jsonl')
+    export_jsonl.short_description = "Export selected transactions and lines (JSON lines)"
+
+    # Edits made here bypass orders.py, so recompute the affected customers and days
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.user_id:
+            rebuild_summaries([obj.user_id])
+        rebuild_rollups([timezone.localdate(obj.transaction_date)])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        if obj.user_id:
+            rebuild_summaries([obj.user_id])
+        rebuild_rollups([timezone.localdate(obj.transaction_date)])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.exclude(user=None).values_list('user_id', flat=True))
+        dates = _order_dates(queryset)
+        super().delete_queryset(request, queryset)
+        rebuild_summaries(user_ids)
+        rebuild_rollups(dates)
+
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ('user', 'session_key')
-    search_fields = ('user__username', 'session_key')
+    list_select_related = ('user',)
+    search_fields = ('^user__username', '=session_key')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ('cart', 'product', 'quantity')
-    search_fields = ('product__name',)
+    list_display = ('owner', 'product_name', 'size', 'color', 'quantity')
+    # CartItem.__str__, used for each row's checkbox label, reads the cart's user and product
+    list_select_related = ('cart__user', 'product', 'size', 'color')
+    search_fields = ('^product__name', '^cart__user__username', '=cart__session_key')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def owner(self, obj):
+        return obj.cart.user.username if obj.cart.user else obj.cart.session_key
+    owner.admin_order_field = 'cart__user__username'
+
+    def product_name(self, obj):
+        return obj.product.name
+    product_name.short_description = "Product"
+    product_name.admin_order_field = 'product__name'
 
 # @admin.register(Newsletter)
 # class NewsletterAdmin(admin.ModelAdmin):
 #     list_display = ('email', 'created_at')
 #     search_fields = ('email',)
     
+def _sync_product_stock(product_ids):
+    # orders.py checks a variant line against both counters, so keep each
+    # product's in_stock equal to the sum of its variants
+    totals = ProductVariant.objects.filter(product_id__in=product_ids).values('product_id').annotate(total=Sum('stock'))
+    for row in totals:
+        Product.objects.filter(pk=row['product_id']).exclude(in_stock=row['total']).update(in_stock=row['total'])
+
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
 
+class ProductVariantInline(admin.TabularInline):
+    model = ProductVariant
+    extra = 1
+    fields = ('size', 'color', 'stock', 'price')
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'in_stock', 'is_active')
+    list_display = ('name', 'sku', 'price', 'in_stock', 'is_active')
     list_filter = ('category', 'is_active')
-    search_fields = ('name', 'description')
-    inlines = [ProductImageInline]
+    search_fields = ('name', 'description', '=sku')
+    inlines = [ProductImageInline, ProductVariantInline]
     filter_horizontal = ('sizes', 'colors')  # Use filter_horizontal for better many-to-many UI
+
+    def save_model(self, request, obj, form, change):
+        # Stock before the edit, so save_related can log what changed
+        obj._stock_before = current_levels([obj.pk], obj.variants.values_list('pk', flat=True)) if change else {}
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        product = form.instance
+        _sync_product_stock([product.pk])
+
+        before = getattr(product, '_stock_before', {})
+        counters = [(product.pk, None)] + [(product.pk, pk) for pk in product.variants.values_list('pk', flat=True)]
+        record_changes(
+            {key: before.get(key, 0) for key in counters},
+            kind='adjustment' if change else 'restock',
+            note=f"Edited in admin by {request.user.get_username()}",
+        )
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_catalog_view), name='SoftBoyCrownApp_product_import'),
+        ] + super().get_urls()
+
+    def import_catalog_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        form = CatalogUploadForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                rows = read_catalog(form.cleaned_data['catalog'])
+            except (CatalogError, UnicodeDecodeError) as e:
+                form.add_error('catalog', str(e))
+            else:
+                report = import_catalog(rows)
+                self.message_user(request, (
+                    f"Imported {report['created'] + report['updated']} products "
+                    f"({report['created']} new, {report['updated']} updated) and {report['images']} images "
+                    f"in {report['seconds']:.1f}s."
+                ), messages.SUCCESS)
+                if report['emptied_variants']:
+                    self.message_user(request, (
+                        f"{report['emptied_variants']} variants missing from the catalog now have no stock."
+                    ), messages.WARNING)
+                for error in report['errors'][:20]:
+                    self.message_user(request, error, messages.WARNING)
+                if len(report['errors']) > 20:
+                    self.message_user(request, f"... and {len(report['errors']) - 20} more errors.", messages.WARNING)
+                return redirect('admin:SoftBoyCrownApp_product_changelist')
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta, form=form, title="Import catalog")
+        return TemplateResponse(request, 'admin/SoftBoyCrownApp/product/import_catalog.html', context)
+
+@admin.register(ProductVariant)
+class ProductVariantAdmin(admin.ModelAdmin):
+    list_display = ('product', 'size', 'color', 'stock', 'price')
+    list_filter = ('size', 'color')
+    list_select_related = ('product', 'size', 'color')
+    search_fields = ('product__name',)
+
+    def save_model(self, request, obj, form, change):
+        product_ids = {obj.product_id}
+        if change:
+            product_ids.add(ProductVariant.objects.get(pk=obj.pk).product_id)
+        before = current_levels(product_ids, [obj.pk] if change else [])
+        super().save_model(request, obj, form, change)
+        _sync_product_stock(product_ids)
+        record_changes(
+            {(obj.product_id, obj.pk): 0, **before},
+            kind='adjustment' if change else 'restock',
+            note=f"Edited in admin by {request.user.get_username()}",
+        )
+
+    def delete_model(self, request, obj):
+        before = current_levels([obj.product_id])
+        super().delete_model(request, obj)
+        _sync_product_stock([obj.product_id])
+        record_changes(before, note=f"Variant deleted in admin by {request.user.get_username()}")
+
+    def delete_queryset(self, request, queryset):
+        before = current_levels(set(queryset.values_list('product_id', flat=True)))
+        super().delete_queryset(request, queryset)
+        _sync_product_stock([product_id for product_id, variant_id in before])
+        record_changes(before, note=f"Variants deleted in admin by {request.user.get_username()}")
     
 @admin.register(Size)
 class SizeAdmin(admin.ModelAdmin):
@@ -122,9 +413,31 @@ admin.site.register(HomePageImages)
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('transaction', 'product', 'quantity', 'price')
+    list_display = ('tx_ref', 'product_name', 'size', 'color', 'quantity', 'price', 'line_total')
     list_filter = ('transaction__transaction_status',)
-    search_fields = ('transaction__tx_ref', 'product__name')
+    list_select_related = ('transaction', 'product', 'size', 'color')
+    search_fields = ('=transaction__tx_ref', '^product__name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            subtotal=ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        )
+
+    def tx_ref(self, obj):
+        return obj.transaction.tx_ref
+    tx_ref.short_description = "Order"
+    tx_ref.admin_order_field = 'transaction__tx_ref'
+
+    def product_name(self, obj):
+        return obj.product.name
+    product_name.short_description = "Product"
+    product_name.admin_order_field = 'product__name'
+
+    def line_total(self, obj):
+        return obj.subtotal
+    line_total.admin_order_field = 'subtotal'
 
 # admin.py
 @admin.register(LookbookImage)
@@ -141,4 +454,166 @@ class LookbookImageAdmin(admin.ModelAdmin):
 
     def make_inactive(self, request, queryset):
         queryset.update(is_active=False)
-    make_inactive.short_description = "Mark selected images as inactive"
\ No newline at end of file
+    make_inactive.short_description = "Mark selected images as inactive"
+
+@admin.register(CustomerOrderSummary)
+class CustomerOrderSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'open_orders', 'approved_orders', 'declined_orders', 'lifetime_spend', 'last_order_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'user__email')
+    ordering = ('-lifetime_spend',)
+    readonly_fields = ('user', 'open_orders', 'approved_orders', 'declined_orders', 'lifetime_spend', 'last_order_at', 'updated_at')
+    actions = ['rebuild']
+
+    def has_add_permission(self, request):
+        return False
+
+    def rebuild(self, request, queryset):
+        rebuilt = rebuild_summaries(list(queryset.values_list('user_id', flat=True)))
+        self.message_user(request, f"{rebuilt} summaries have been recomputed.")
+    rebuild.short_description = "Recompute selected summaries from transactions"
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('transaction', 'product', 'variant', 'quantity', 'expires_at')
+    list_select_related = ('transaction', 'product', 'variant__size', 'variant__color')
+    search_fields = ('=transaction__tx_ref', 'product__name')
+    raw_id_fields = ('transaction', 'product', 'variant')
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event', 'flw_transaction_id', 'tx_ref', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status', 'event')
+    search_fields = ('=flw_transaction_id', '=tx_ref')
+    readonly_fields = ('event', 'flw_transaction_id', 'tx_ref', 'payload', 'attempts', 'next_attempt_at', 'last_error', 'received_at', 'locked_at', 'processed_at')
+    actions = ['requeue_events']
+
+    def requeue_events(self, request, queryset):
+        updated = queryset.exclude(status='processed').update(
+            status='pending', locked_at=None, next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f"{updated} webhook events have been queued again.")
+    requeue_events.short_description = "Queue selected events for processing again"
+
+@admin.register(WebhookJournalEntry)
+class WebhookJournalEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'received_at', 'remote_addr', 'size')
+    date_hierarchy = 'received_at'
+    fields = ('received_at', 'remote_addr', 'size', 'payload')
+    readonly_fields = fields
+
+    def payload(self, obj):
+        return obj.raw_body().decode('utf-8', errors='replace')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'to_email', 'transaction', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    list_select_related = ('transaction__user',)
+    search_fields = ('=to_email', '=transaction__tx_ref')
+    readonly_fields = ('kind', 'transaction', 'to_email', 'subject', 'body', 'html_body', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} emails will be retried on the next send_emails run.")
+    retry_now.short_description = "Retry selected emails now"
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    # A read-only sales dashboard built from the rollup tables alone
+    dashboard_days = 30
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            days = max(1, min(int(request.GET.get('days', self.dashboard_days)), 366))
+        except ValueError:
+            days = self.dashboard_days
+        status = request.GET.get('status', 'approved')
+        if status not in dict(ROLLUP_STATUS_CHOICES):
+            status = 'approved'
+        end = timezone.localdate()
+        start = end - timedelta(days=days - 1)
+
+        daily = DailySales.objects.filter(date__gte=start, status=status).order_by('-date')
+        lines = DailyProductSales.objects.filter(date__gte=start, status=status)
+        categories = list(
+            lines.values('category_id').annotate(category_name=Max('category_name'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')
+        )
+        by_day = {}
+        for row in lines.values('date', 'category_id').annotate(revenue=Sum('revenue')):
+            by_day.setdefault(row['date'], {})[row['category_id']] = row['revenue']
+        rows = []
+        for day in daily:
+            per_category = by_day.get(day.date, {})
+            rows.append((day, [per_category.get(category['category_id'], 0) for category in categories]))
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Sales dashboard",
+            days=days,
+            day_choices=(7, 30, 90, 365),
+            status=status,
+            status_choices=ROLLUP_STATUS_CHOICES,
+            totals=daily.aggregate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue')),
+            categories=categories,
+            rows=rows,
+            top_products=lines.values('product_id').annotate(
+                product_name=Max('product_name'), units=Sum('units'), revenue=Sum('revenue'),
+            ).order_by('-revenue')[:20],
+            **(extra_context or {}),
+        )
+        return TemplateResponse(request, 'admin/SoftBoyCrownApp/dailysales/dashboard.html', context)
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'product', 'variant', 'kind', 'quantity', 'transaction', 'note')
+    list_filter = ('kind',)
+    list_select_related = ('product', 'variant__product', 'variant__size', 'variant__color', 'transaction__user')
+    search_fields = ('^product__name', '=product__sku', '=transaction__tx_ref')
+    raw_id_fields = ('product', 'variant', 'transaction')
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # The ledger is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('taken_at', 'product', 'variant', 'quantity', 'last_movement_id')
+    list_select_related = ('product', 'variant__product', 'variant__size', 'variant__color')
+    search_fields = ('^product__name', '=product__sku')
+    raw_id_fields = ('product', 'variant')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
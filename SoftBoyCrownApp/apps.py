@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SoftboycrownappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'SoftBoyCrownApp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .checks import require_webhook_secret
+
+        require_webhook_secret()
@@ -0,0 +1,406 @@
+import csv
+import io
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urljoin, urlparse
+
+import requests
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction as db_transaction
+from PIL import Image
+
+from .ledger import current_levels, record_changes
+from .models import Category, Color, Product, ProductImage, ProductVariant, Size, get_default_category
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+IMAGE_WORKERS = 8
+IMAGE_TIMEOUT = (3.05, 20)
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_REDIRECTS = 3
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+PRODUCT_UPDATE_FIELDS = ['name', 'price', 'slash_price', 'category', 'in_stock', 'description', 'is_active', 'updated_at']
+
+
+class CatalogError(Exception):
+    """The catalog file could not be read at all."""
+
+
+def read_catalog(file, format=None):
+    """
+    Parse a CSV or JSON catalog into a list of row dicts. ``file`` is a path
+    or an open binary file; the format defaults to the file extension.
+
+    CSV lists sizes, colors and images separated by "|", with an optional
+    ":#hex" after a color name, and per-variant stock as "size/color=stock"
+    entries, e.g. "M/Black=3|L/Black=0". JSON is a list of objects with the
+    same keys, where those four may be lists (variants of objects with size,
+    color and stock).
+    """
+    name = file if isinstance(file, str) else getattr(file, 'name', '')
+    format = format or os.path.splitext(name)[1].lstrip('.').lower()
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            data = f.read()
+    else:
+        data = file.read()
+    text = data.decode('utf-8-sig')
+
+    if format == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    if format == 'json':
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise CatalogError(f"Invalid JSON: {e}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise CatalogError("A JSON catalog must be a list of objects.")
+        return rows
+    raise CatalogError(f"Unsupported catalog format {format!r}; use csv or json.")
+
+
+def _split(value):
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        value = value.split('|')
+    return [str(part).strip() for part in value if str(part).strip()]
+
+
+def _decimal(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{field} is not a number: {value!r}")
+
+
+def _stock(value, field):
+    try:
+        stock = int(value) if value not in (None, '') else 0
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a whole number: {value!r}")
+    if stock < 0:
+        raise ValueError(f"{field} can't be negative")
+    return stock
+
+
+def _variants(value):
+    # [(size, color, stock)], with None for a missing size or color
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.split('|') if part.strip()]
+    variants = {}
+    for variant in value:
+        if isinstance(variant, dict):
+            size, color, stock = variant.get('size'), variant.get('color'), variant.get('stock')
+        else:
+            pair, _, stock = str(variant).partition('=')
+            size, _, color = pair.partition('/')
+        size = str(size or '').strip() or None
+        color = str(color or '').strip() or None
+        if (size, color) in variants:
+            raise ValueError(f"variant {size or 'No size'}/{color or 'No color'} is listed twice")
+        variants[size, color] = _stock(stock, f"stock for {size or 'No size'}/{color or 'No color'}")
+    return [(size, color, stock) for (size, color), stock in variants.items()]
+
+
+def _clean(row):
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise ValueError("sku is required")
+    colors = {}
+    for color in _split(row.get('colors')):
+        color_name, _, hex_code = color.partition(':')
+        colors[color_name.strip()] = hex_code.strip() or None
+    sizes = _split(row.get('sizes'))
+    in_stock = _stock(row.get('in_stock'), 'in_stock')
+    variants = _variants(row.get('variants'))
+    if variants:
+        for size, color, stock in variants:
+            if size and size not in sizes:
+                sizes.append(size)
+            if color:
+                colors.setdefault(color, None)
+        total = sum(stock for size, color, stock in variants)
+        if row.get('in_stock') not in (None, '') and in_stock != total:
+            raise ValueError(f"in_stock ({in_stock}) doesn't match the variant stock ({total})")
+        in_stock = total
+    elif sizes or colors:
+        # No per-variant stock given: split in_stock evenly, the remainder going to the first variants
+        pairs = [(size, color) for size in sizes or [None] for color in colors or [None]]
+        share, remainder = divmod(in_stock, len(pairs))
+        variants = [(size, color, share + (i < remainder)) for i, (size, color) in enumerate(pairs)]
+    is_active = row.get('is_active', True)
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() not in ('0', 'false', 'no', '')
+    return {
+        'sku': sku,
+        'name': str(row.get('name') or '').strip() or None,
+        'price': _decimal(row.get('price'), 'price', required=True),
+        'slash_price': _decimal(row.get('slash_price'), 'slash_price'),
+        'category': str(row.get('category') or '').strip() or None,
+        'category_description': str(row.get('category_description') or '').strip() or None,
+        'in_stock': in_stock,
+        'description': str(row.get('description') or ''),
+        'is_active': bool(is_active),
+        'sizes': sizes,
+        'colors': colors,
+        'variants': variants,
+        'images': _split(row.get('images')),
+    }
+
+
+def _upsert_lookups(rows):
+    categories = {}
+    for row in rows:
+        if row['category'] and (row['category_description'] or row['category'] not in categories):
+            categories[row['category']] = row['category_description']
+    described = [Category(name=name, description=description) for name, description in categories.items() if description]
+    Category.objects.bulk_create(
+        described, update_conflicts=True, unique_fields=['name'], update_fields=['description'], batch_size=BATCH_SIZE,
+    )
+    Category.objects.bulk_create(
+        [Category(name=name) for name, description in categories.items() if not description],
+        ignore_conflicts=True, batch_size=BATCH_SIZE,
+    )
+
+    sizes = {name for row in rows for name in row['sizes']}
+    Size.objects.bulk_create([Size(name=name) for name in sizes], ignore_conflicts=True, batch_size=BATCH_SIZE)
+
+    colors = {}
+    for row in rows:
+        for name, hex_code in row['colors'].items():
+            if hex_code or name not in colors:
+                colors[name] = hex_code
+    Color.objects.bulk_create(
+        [Color(name=name, hex_code=hex_code) for name, hex_code in colors.items() if hex_code],
+        update_conflicts=True, unique_fields=['name'], update_fields=['hex_code'], batch_size=BATCH_SIZE,
+    )
+    Color.objects.bulk_create(
+        [Color(name=name) for name, hex_code in colors.items() if not hex_code],
+        ignore_conflicts=True, batch_size=BATCH_SIZE,
+    )
+
+    return (
+        dict(Category.objects.filter(name__in=categories).values_list('name', 'pk')),
+        dict(Size.objects.filter(name__in=sizes).values_list('name', 'pk')),
+        dict(Color.objects.filter(name__in=colors).values_list('name', 'pk')),
+    )
+
+
+def _link(through, field, product_ids, links):
+    # Imported products get exactly the catalog's sizes/colors
+    through.objects.filter(product_id__in=product_ids).delete()
+    through.objects.bulk_create([
+        through(product_id=product_id, **{f'{field}_id': related_id}) for product_id, related_id in links
+    ], ignore_conflicts=True, batch_size=BATCH_SIZE)
+
+
+def _upsert_variants(rows, product_ids, size_ids, color_ids):
+    # Set the catalog's variants, so in_stock is the sum of their stock. A
+    # variant the catalog leaves out is kept (with its ledger history) but
+    # emptied, and so is a product listed without variants that still has
+    # some. Returns how many variants were emptied.
+    existing = {
+        (product_id, size_id, color_id): pk
+        for pk, product_id, size_id, color_id in ProductVariant.objects.filter(
+            product_id__in=product_ids.values(),
+        ).values_list('pk', 'product_id', 'size_id', 'color_id')
+    }
+    wanted = {
+        (product_ids[row['sku']], size_ids.get(size), color_ids.get(color)): stock
+        for row in rows for size, color, stock in row['variants']
+    }
+    dropped = ProductVariant.objects.filter(pk__in=[pk for key, pk in existing.items() if key not in wanted])
+    emptied = dropped.exclude(stock=0).update(stock=0)
+    Product.objects.filter(
+        pk__in=[product_ids[row['sku']] for row in rows if not row['variants']], variants__isnull=False,
+    ).update(in_stock=0)
+    ProductVariant.objects.bulk_update([
+        ProductVariant(pk=existing[key], stock=stock) for key, stock in wanted.items() if key in existing
+    ], ['stock'], batch_size=BATCH_SIZE)
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product_id=product_id, size_id=size_id, color_id=color_id, stock=stock)
+        for (product_id, size_id, color_id), stock in wanted.items() if (product_id, size_id, color_id) not in existing
+    ], batch_size=BATCH_SIZE)
+    return emptied
+
+
+def _image_name(sku, index, source):
+    ext = os.path.splitext(urlparse(source).path)[1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        ext = '.jpg'
+    safe_sku = ''.join(c if c.isalnum() or c in '-_' else '-' for c in sku)
+    return f"product_images/catalog/{safe_sku}-{index}{ext}"
+
+
+def _check_public(url):
+    # Keep catalog URLs from reaching the server's own network
+    host = urlparse(url).hostname
+    if not host:
+        raise ValueError(f"{url} has no host")
+    for *_, address in socket.getaddrinfo(host, None):
+        if not ipaddress.ip_address(address[0]).is_global:
+            raise ValueError(f"{host} is not a public address")
+
+
+def _download(url):
+    for _ in range(IMAGE_MAX_REDIRECTS + 1):
+        _check_public(url)
+        with requests.get(url, timeout=IMAGE_TIMEOUT, allow_redirects=False, stream=True) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers['Location'])
+                if urlparse(url).scheme not in ('http', 'https'):
+                    raise ValueError(f"redirects to {url}")
+                continue
+            response.raise_for_status()
+            content = response.raw.read(IMAGE_MAX_BYTES + 1, decode_content=True)
+        if len(content) > IMAGE_MAX_BYTES:
+            raise ValueError(f"is larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+        return content
+    raise ValueError("redirects too many times")
+
+
+def _read_local(source, image_dir):
+    if not image_dir:
+        raise ValueError("local image paths are only read by `manage.py import_catalog` with an image directory")
+    root = os.path.realpath(image_dir)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError("is outside the image directory")
+    with open(path, 'rb') as f:
+        content = f.read(IMAGE_MAX_BYTES + 1)
+    if len(content) > IMAGE_MAX_BYTES:
+        raise ValueError(f"is larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+    return content
+
+
+def _fetch_image(job, image_dir=None):
+    product_id, name, source = job
+    if default_storage.exists(name):
+        return product_id, name
+    scheme = urlparse(source).scheme
+    if scheme in ('http', 'https'):
+        content = _download(source)
+    elif scheme:
+        raise ValueError(f"unsupported scheme {scheme!r}")
+    else:
+        content = _read_local(source, image_dir)
+    try:
+        Image.open(io.BytesIO(content)).verify()
+    except Exception:
+        raise ValueError("is not an image")
+    return product_id, default_storage.save(name, ContentFile(content))
+
+
+def import_catalog(rows, image_workers=IMAGE_WORKERS, image_dir=None):
+    """
+    Upsert categories, sizes, colors and products (matched on ``sku``) from
+    catalog rows, replace the products' size/color links and variants and
+    attach any images not already imported, fetched ``image_workers`` at a
+    time. A product with sizes or colors gets a variant per pair; without
+    per-variant stock its in_stock is split evenly between them. Variants
+    missing from the catalog are kept with their stock set to 0.
+
+    Images are public http(s) URLs or, only when ``image_dir`` is given,
+    paths inside it; anything that isn't an image is rejected.
+
+    Rows that fail validation are skipped; the rest are written in one
+    database transaction. Returns a dict of counts, errors and timings.
+    """
+    started = time.monotonic()
+    cleaned = {}
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            row = _clean(row)
+        except ValueError as e:
+            errors.append(f"Row {number}: {e}")
+            continue
+        cleaned[row['sku']] = row  # A later row for the same sku wins
+    rows = list(cleaned.values())
+
+    with db_transaction.atomic():
+        category_ids, size_ids, color_ids = _upsert_lookups(rows)
+        existing = dict(Product.objects.filter(sku__in=cleaned).values_list('sku', 'pk'))
+        before = current_levels(
+            existing.values(),
+            ProductVariant.objects.filter(product_id__in=existing.values()).values_list('pk', flat=True),
+        )
+        default_category = None
+        if any(not row['category'] for row in rows):
+            default_category = get_default_category()
+        Product.objects.bulk_create([
+            Product(
+                sku=row['sku'],
+                name=row['name'],
+                price=row['price'],
+                slash_price=row['slash_price'],
+                category_id=category_ids[row['category']] if row['category'] else default_category,
+                in_stock=row['in_stock'],
+                description=row['description'],
+                is_active=row['is_active'],
+            )
+            for row in rows
+        ], update_conflicts=True, unique_fields=['sku'], update_fields=PRODUCT_UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        product_ids = dict(Product.objects.filter(sku__in=cleaned).values_list('sku', 'pk'))
+
+        ids = list(product_ids.values())
+        _link(Product.sizes.through, 'size', ids, [
+            (product_ids[row['sku']], size_ids[name]) for row in rows for name in row['sizes']
+        ])
+        _link(Product.colors.through, 'color', ids, [
+            (product_ids[row['sku']], color_ids[name]) for row in rows for name in row['colors']
+        ])
+        emptied = _upsert_variants(rows, product_ids, size_ids, color_ids)
+        created_variants = ProductVariant.objects.filter(product_id__in=ids).exclude(
+            pk__in=[variant_id for product_id, variant_id in before if variant_id is not None],
+        )
+        record_changes({
+            **{(pk, None): 0 for pk in ids},
+            **{key: 0 for key in created_variants.values_list('product_id', 'pk')},
+            **before,
+        }, note="Catalog import")
+        attached = set(ProductImage.objects.filter(product_id__in=ids).values_list('image', flat=True))
+    database_seconds = time.monotonic() - started
+
+    jobs = []
+    for row in rows:
+        for index, source in enumerate(row['images'], start=1):
+            name = _image_name(row['sku'], index, source)
+            if name not in attached:
+                jobs.append((product_ids[row['sku']], name, source))
+    images = []
+    if jobs:
+        with ThreadPoolExecutor(max_workers=image_workers) as pool:
+            futures = [(job, pool.submit(_fetch_image, job, image_dir)) for job in jobs]
+            for (product_id, name, source), future in futures:
+                try:
+                    images.append(ProductImage(product_id=product_id, image=future.result()[1]))
+                except Exception as e:
+                    logger.warning("Could not fetch image %s: %s", source, e)
+                    errors.append(f"Image {source}: {e}")
+        ProductImage.objects.bulk_create(images, batch_size=BATCH_SIZE)
+
+    return {
+        'created': len(rows) - len(existing),
+        'updated': len(existing),
+        'images': len(images),
+        'emptied_variants': emptied,
+        'errors': errors,
+        'database_seconds': database_seconds,
+        'seconds': time.monotonic() - started,
+    }
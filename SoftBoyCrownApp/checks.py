@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.core.exceptions import ImproperlyConfigured
+
+MISSING_SECRET_HASH = "FLUTTERWAVE_SECRET_HASH is not set, so every payment webhook is rejected."
+
+
+@register(Tags.security)
+def check_webhook_secret(app_configs, **kwargs):
+    if settings.FLUTTERWAVE_SECRET_HASH:
+        return []
+    return [Warning(
+        MISSING_SECRET_HASH,
+        hint="Set it to the secret hash on the Flutterwave dashboard. Without DEBUG the site won't start.",
+        id='SoftBoyCrownApp.W001',
+    )]
+
+
+def require_webhook_secret():
+    # Checks don't run under a WSGI server, so refuse to start there instead
+    if not settings.DEBUG and not settings.FLUTTERWAVE_SECRET_HASH:
+        raise ImproperlyConfigured(MISSING_SECRET_HASH)
@@ -0,0 +1,149 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Prefetch
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboundEmail, ProductImage
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+SEND_LEASE = timedelta(minutes=10)
+
+
+def queue_email(transaction, kind):
+    """
+    Add an email to the outbox. Call this inside the same database
+    transaction as the change it reports so both commit (or roll back) together.
+    """
+    if not transaction.user_id or not transaction.user.email:
+        return None
+    return OutboundEmail.objects.create(kind=kind, transaction=transaction, to_email=transaction.user.email)
+
+
+def queue_emails(transactions, kind):
+    """queue_email for many transactions in one INSERT. Their users must be loaded."""
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(kind=kind, transaction=transaction, to_email=transaction.user.email)
+        for transaction in transactions
+        if transaction.user_id and transaction.user.email
+    ])
+
+
+def _order_context(transaction):
+    order_items = list(
+        transaction.order_items.select_related('product', 'size', 'color').prefetch_related(
+            Prefetch('product__images', queryset=ProductImage.objects.order_by('pk'))
+        )
+    )
+    for item in order_items:
+        images = item.product.images.all()
+        item.image_url = f"{settings.SITE_URL}{images[0].image.url}" if images else ''
+    address = transaction.address
+    address_text = (
+        f"{address.street}, {address.city}, {address.state}, {address.postal_code}, {address.country}"
+        if address else ''
+    )
+    subtotal = transaction.subtotal
+    if subtotal is None:
+        # Orders placed before totals were stored on the transaction
+        subtotal = sum(item.total_price() for item in order_items)
+    return {
+        'transaction': transaction,
+        'order_items': order_items,
+        'subtotal': subtotal,
+        'shipping_fee': transaction.amount - subtotal,
+        'address_text': address_text,
+    }
+
+
+def render_email(email):
+    """Fill in subject and bodies from the templates for the email's kind."""
+    transaction = email.transaction
+    if email.kind == 'order_confirmation':
+        context = _order_context(transaction)
+        email.subject = 'Soft Boy Crown - Order Confirmation'
+    else:
+        context = {'transaction': transaction}
+        email.subject = f"Soft Boy Crown - Order {transaction.tx_ref} {transaction.get_transaction_status_display()}"
+    email.body = render_to_string(f'SoftBoyCrownApp/emails/{email.kind}.txt', context)
+    email.html_body = render_to_string(f'SoftBoyCrownApp/emails/{email.kind}.html', context)
+
+
+def _schedule_retry(email, error):
+    attempts = email.attempts + 1
+    if attempts >= MAX_ATTEMPTS:
+        status, next_attempt_at = 'failed', timezone.now()
+    else:
+        status = 'pending'
+        next_attempt_at = timezone.now() + min(RETRY_BASE_DELAY * (2 ** (attempts - 1)), RETRY_MAX_DELAY)
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=str(error),
+    )
+
+
+def send_pending(connection=None, batch_size=50):
+    """
+    Send one batch of due outbox emails over a single SMTP connection.
+    Returns (sent, failed) counts for the batch.
+    """
+    now = timezone.now()
+    due = list(
+        OutboundEmail.objects.filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+        .order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size]
+    )
+    if not due:
+        return 0, 0
+    # Claim the batch so a second worker skips it; if this worker dies the
+    # claim lapses after SEND_LEASE and the emails are picked up again.
+    lease = now + SEND_LEASE
+    OutboundEmail.objects.filter(
+        pk__in=due, status__in=['pending', 'sending'], next_attempt_at__lte=now,
+    ).update(status='sending', next_attempt_at=lease)
+    emails = list(
+        OutboundEmail.objects.filter(pk__in=due, status='sending', next_attempt_at=lease)
+        .select_related('transaction__user', 'transaction__address')
+    )
+
+    own_connection = connection is None
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        for email in emails:
+            try:
+                if not email.body:
+                    render_email(email)
+                # An open connection is reused by send(); a closed one would be
+                # opened and closed again for every message
+                connection.open()
+                message = EmailMultiAlternatives(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[email.to_email],
+                    connection=connection,
+                )
+                message.attach_alternative(email.html_body, 'text/html')
+                message.send()
+            except Exception as e:
+                logger.warning("Failed to send email %s to %s: %s", email.pk, email.to_email, e)
+                # Start from a fresh SMTP session in case the server dropped us
+                connection.close()
+                _schedule_retry(email, e)
+                failed += 1
+                continue
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error=None,
+                subject=email.subject, body=email.body, html_body=email.html_body,
+            )
+            sent += 1
+    finally:
+        if own_connection:
+            connection.close()
+    return sent, failed
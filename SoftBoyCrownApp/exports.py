@@ -0,0 +1,79 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import OrderItem
+
+CHUNK_SIZE = 2000
+
+COLUMNS = [
+    'tx_ref', 'transaction_date', 'transaction_status', 'flw_transaction_id',
+    'customer', 'email', 'amount', 'subtotal', 'shipping_fee',
+    'full_name', 'phone_number', 'street', 'city', 'state', 'postal_code', 'country', 'shipping_zone',
+    'product', 'size', 'color', 'quantity', 'price', 'line_total',
+]
+
+
+def export_rows(transactions, chunk_size=CHUNK_SIZE):
+    """
+    Yield one dict per order line (or one per transaction with no lines),
+    reading ``chunk_size`` transactions and their lines at a time.
+    """
+    transactions = transactions.select_related('user', 'address').prefetch_related(
+        Prefetch('order_items', queryset=OrderItem.objects.select_related('product', 'size', 'color').order_by('pk'))
+    ).order_by('pk')
+    for transaction in transactions.iterator(chunk_size=chunk_size):
+        user = transaction.user
+        address = transaction.address
+        row = {
+            'tx_ref': transaction.tx_ref,
+            'transaction_date': transaction.transaction_date.isoformat(),
+            'transaction_status': transaction.transaction_status,
+            'flw_transaction_id': transaction.flw_transaction_id or '',
+            'customer': user.username if user else '',
+            'email': user.email if user else '',
+            'amount': str(transaction.amount),
+            'subtotal': '' if transaction.subtotal is None else str(transaction.subtotal),
+            'shipping_fee': '' if transaction.shipping_fee is None else str(transaction.shipping_fee),
+        }
+        for field in ('full_name', 'phone_number', 'street', 'city', 'state', 'postal_code', 'country', 'shipping_zone'):
+            row[field] = (getattr(address, field) or '') if address else ''
+
+        items = transaction.order_items.all()
+        if not items:
+            yield dict(row, product='', size='', color='', quantity='', price='', line_total='')
+        for item in items:
+            yield dict(
+                row,
+                product=item.product.name or '',
+                size=item.size.name if item.size else '',
+                color=item.color.name if item.color else '',
+                quantity=item.quantity,
+                price=str(item.price),
+                line_total=str(item.total_price()),
+            )
+
+
+class _Echo:
+    # csv.writer needs a file; this one hands each line straight back
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=COLUMNS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson'),
+}
@@ -360,4 +360,7 @@ class AddressForm(forms.ModelForm):
         
 
 # class NewsletterForm(forms.Form):
-#     email = forms.EmailField(label='Email', max_length=255)
\ No newline at end of file
+#     email = forms.EmailField(label='Email', max_length=255)
+
+class CatalogUploadForm(forms.Form):
+    catalog = forms.FileField(help_text="A .csv or .json catalog file")
@@ -0,0 +1,142 @@
+from django.db import transaction as db_transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import Product, ProductVariant, StockMovement, StockSnapshot
+
+
+def record_sales(order_items):
+    """Log stock taken by order lines: a row per counter decremented."""
+    movements = []
+    for item in order_items:
+        movements.append(StockMovement(
+            product_id=item.product_id, kind='sale', quantity=-item.quantity, transaction_id=item.transaction_id,
+        ))
+        if item.variant_id:
+            movements.append(StockMovement(
+                product_id=item.product_id, variant_id=item.variant_id, kind='sale',
+                quantity=-item.quantity, transaction_id=item.transaction_id,
+            ))
+    StockMovement.objects.bulk_create(movements)
+
+
+def record_releases(holds, note=''):
+    """Log StockReservation rows (or their values() dicts) that were let go."""
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=hold['product_id'], variant_id=hold['variant_id'], kind='release',
+            quantity=hold['quantity'], transaction_id=hold['transaction_id'], note=note,
+        )
+        for hold in holds
+    ])
+
+
+def release_holds(holds, note=''):
+    """Delete a StockReservation queryset, logging what it released."""
+    released = list(holds.values('pk', 'product_id', 'variant_id', 'quantity', 'transaction_id'))
+    if released:
+        holds.model.objects.filter(pk__in=[hold['pk'] for hold in released]).delete()
+        record_releases(released, note)
+    return len(released)
+
+
+def current_levels(product_ids=(), variant_ids=()):
+    """Live counters keyed (product_id, variant_id), variant_id None for a product."""
+    levels = {(pk, None): in_stock for pk, in_stock in Product.objects.filter(pk__in=product_ids).values_list('pk', 'in_stock')}
+    for pk, product_id, stock in ProductVariant.objects.filter(pk__in=variant_ids).values_list('pk', 'product_id', 'stock'):
+        levels[product_id, pk] = stock
+    return levels
+
+
+def record_changes(before, kind='adjustment', note=''):
+    """
+    Log the difference between ``before`` (from current_levels; missing
+    counters count as 0) and the same counters now.
+    """
+    after = current_levels(
+        [product_id for product_id, variant_id in before if variant_id is None],
+        [variant_id for product_id, variant_id in before if variant_id is not None],
+    )
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=key[0], variant_id=key[1], kind=kind, quantity=quantity - before.get(key, 0), note=note)
+        for key, quantity in after.items()
+        if quantity != before.get(key, 0)
+    ])
+
+
+def _counted():
+    return StockMovement.objects.exclude(kind='release')
+
+
+def stock_level(product, variant=None, at=None):
+    """
+    A counter's stock according to the ledger, now or at ``at``: the latest
+    snapshot before then plus the movements after it. None if ``at`` is
+    before the counter's first snapshot or movement.
+    """
+    snapshots = StockSnapshot.objects.filter(product=product, variant=variant)
+    if at is not None:
+        snapshots = snapshots.filter(taken_at__lte=at)
+    snapshot = snapshots.order_by('-taken_at', '-last_movement_id').first()
+
+    movements = _counted().filter(product=product, variant=variant)
+    if snapshot:
+        movements = movements.filter(pk__gt=snapshot.last_movement_id)
+    elif at is not None and not StockMovement.objects.filter(product=product, variant=variant, created_at__lte=at).exists():
+        return None
+    if at is not None:
+        movements = movements.filter(created_at__lte=at)
+    delta = movements.aggregate(total=Sum('quantity'))['total'] or 0
+    return (snapshot.quantity if snapshot else 0) + delta
+
+
+def ledger_levels(up_to=None):
+    """
+    Every counter's ledger balance, keyed like current_levels: the latest
+    snapshot batch plus one grouped scan of the movements since.
+    """
+    mark = StockSnapshot.objects.aggregate(mark=Max('last_movement_id'))['mark']
+    levels = {}
+    if mark is not None:
+        for product_id, variant_id, quantity in StockSnapshot.objects.filter(last_movement_id=mark).values_list(
+            'product_id', 'variant_id', 'quantity',
+        ):
+            levels[product_id, variant_id] = quantity
+    movements = _counted().filter(pk__gt=mark or 0)
+    if up_to is not None:
+        movements = movements.filter(pk__lte=up_to)
+    for row in movements.values('product_id', 'variant_id').annotate(total=Sum('quantity')).order_by():
+        key = (row['product_id'], row['variant_id'])
+        levels[key] = levels.get(key, 0) + row['total']
+    return levels
+
+
+def take_snapshots():
+    """
+    Store a snapshot batch covering every movement so far. Returns the number
+    of rows written; 0 if nothing has moved since the last batch.
+    """
+    with db_transaction.atomic():
+        mark = StockMovement.objects.aggregate(mark=Max('pk'))['mark'] or 0
+        previous = StockSnapshot.objects.aggregate(mark=Max('last_movement_id'))['mark']
+        if previous is not None and mark <= previous:
+            return 0
+        now = timezone.now()
+        snapshots = StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_id=product_id, variant_id=variant_id, quantity=quantity, last_movement_id=mark, taken_at=now)
+            for (product_id, variant_id), quantity in ledger_levels(up_to=mark).items()
+        ], batch_size=1000)
+    return len(snapshots)
+
+
+def drift():
+    """Counters whose live value differs from the ledger: {key: (ledger, live)}."""
+    ledger = ledger_levels()
+    live = current_levels(
+        Product.objects.values_list('pk', flat=True), ProductVariant.objects.values_list('pk', flat=True),
+    )
+    return {
+        key: (ledger.get(key), live.get(key))
+        for key in set(ledger) | set(live)
+        if ledger.get(key) != live.get(key)
+    }
@@ -0,0 +1,114 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from SoftBoyCrownApp.models import Address, Cart, CartItem, CustomUser, OrderItem, Product, Transaction
+from SoftBoyCrownApp.shipping import zone_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the order, cart and address admin changelists against generated data. "
+        "Runs against a scratch database built like the test database (in memory for SQLite), "
+        "which is dropped afterwards; the real database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000,
+                            help="Transactions, order items and cart items to generate (default: 100000).")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Renders per changelist; the best time is reported (default: 3).")
+
+    def handle(self, *args, **options):
+        # The admin reads through the default alias, so point it at a scratch
+        # database for the run instead of adding rows to the live one
+        real_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(real_name, verbosity=0)
+
+    def _benchmark(self, options):
+        started = time.monotonic()
+        self._populate(options['rows'])
+        self.stdout.write(f"Generated {options['rows']} rows per table in {time.monotonic() - started:.1f}s")
+
+        user = CustomUser.objects.create(username='benchmark-admin', email='benchmark-admin@example.com',
+                                         is_staff=True, is_superuser=True)
+        sample = Transaction.objects.order_by('-pk').values('tx_ref', 'user__username').first()
+        cases = [
+            (Transaction, {}),
+            (Transaction, {'q': sample['tx_ref']}),
+            (Transaction, {'q': sample['user__username'][:6]}),
+            (Transaction, {'transaction_status__exact': 'approved'}),
+            (OrderItem, {}),
+            (OrderItem, {'q': 'Product 1'}),
+            (CartItem, {}),
+            (CartItem, {'q': sample['user__username']}),
+            (Address, {}),
+            (Address, {'q': 'Lag'}),
+        ]
+        for model, params in cases:
+            self._time(model, params, user, options['repeat'])
+
+    def _populate(self, rows):
+        user_count = max(rows // 10, 1)
+        suffix = uuid.uuid4().hex[:6]
+        places = [('Lagos', 'Lagos', 'Nigeria'), ('Abuja', 'FCT', 'Nigeria'), ('Ibadan', 'Oyo', 'Nigeria'),
+                  ('Kano', 'Kano', 'Nigeria'), ('London', 'London', 'United Kingdom'), ('Accra', 'Greater Accra', 'Ghana')]
+
+        addresses = []
+        for i in range(user_count):
+            city, state, country = random.choice(places)
+            # bulk_create skips Address.save(), which normally derives the zone
+            addresses.append(Address(full_name=f"Customer {i}", street=f"{i} Broad Street", city=city, state=state,
+                                     postal_code=f"{100000 + i}", country=country, phone_number=f"080{i:08d}",
+                                     shipping_zone=zone_for(country, state)))
+        addresses = Address.objects.bulk_create(addresses, batch_size=2000)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f"bm{suffix}{i}", email=f"bm{suffix}{i}@example.com",
+                       first_name='Bench', last_name='Mark', address=address)
+            for i, address in enumerate(addresses)
+        ], batch_size=2000)
+        products = Product.objects.bulk_create([
+            Product(name=f"Product {i}", price=Decimal('5000.00'), in_stock=100, description='')
+            for i in range(200)
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users], batch_size=2000)
+        CartItem.objects.bulk_create([
+            CartItem(cart=random.choice(carts), product=random.choice(products), quantity=random.randint(1, 3))
+            for _ in range(rows)
+        ], batch_size=2000)
+        statuses = ['pending', 'approved', 'approved', 'declined']
+        transactions = Transaction.objects.bulk_create([
+            Transaction(user=users[i % user_count], address=addresses[i % user_count],
+                        amount=Decimal('12500.00'), subtotal=Decimal('10000.00'), shipping_fee=Decimal('2500.00'),
+                        tx_ref=f"bm-{suffix}-{i}", transaction_status=random.choice(statuses))
+            for i in range(rows)
+        ], batch_size=2000)
+        OrderItem.objects.bulk_create([
+            OrderItem(transaction=transaction, product=random.choice(products), quantity=2, price=Decimal('5000.00'))
+            for transaction in transactions
+        ], batch_size=2000)
+
+    def _time(self, model, params, user, repeat):
+        model_admin = admin.site._registry[model]
+        best = None
+        for _ in range(repeat):
+            request = RequestFactory().get('/', params)
+            request.user = user
+            with CaptureQueriesContext(connection) as queries:
+                started = time.monotonic()
+                model_admin.changelist_view(request).render()
+                elapsed = time.monotonic() - started
+            best = elapsed if best is None else min(best, elapsed)
+        label = ' '.join(f"{key}={value}" for key, value in params.items()) or 'page 1'
+        self.stdout.write(f"{model.__name__:<12} {label:<40} {best * 1000:8.1f} ms  {len(queries)} queries")
@@ -0,0 +1,138 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction as db_transaction
+from django.db.models import F
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from SoftBoyCrownApp.models import Cart, CartItem, Category, Product
+
+ALIAS = 'sqlite_benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent cart writes (with a few shop readers alongside) on a scratch SQLite "
+        "database, first with SQLite's defaults, then with SQLITE_PRAGMAS and the configured "
+        "transaction_mode. The real database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Concurrent writer threads (default: 8).")
+        parser.add_argument('--readers', type=int, default=2, help="Concurrent reader threads (default: 2).")
+        parser.add_argument('--requests', type=int, default=200,
+                            help="Add-to-cart requests per writer (default: 200).")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("The default database isn't SQLite.")
+        tuned_mode = settings.DATABASES['default'].get('OPTIONS', {}).get('transaction_mode')
+        runs = [
+            ('untuned', {}, None),
+            ('tuned', settings.SQLITE_PRAGMAS, tuned_mode),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            for label, pragmas, transaction_mode in runs:
+                path = os.path.join(directory, f'{label}.sqlite3')
+                connections.settings[ALIAS] = {
+                    **connections.settings['default'],
+                    'NAME': path,
+                    'OPTIONS': {**connections.settings['default']['OPTIONS'], 'transaction_mode': transaction_mode},
+                }
+                try:
+                    with override_settings(SQLITE_PRAGMAS=pragmas):
+                        self._run(label, options)
+                finally:
+                    connections[ALIAS].close()
+                    del connections[ALIAS]
+                    del connections.settings[ALIAS]
+
+    def _run(self, label, options):
+        # Build the tables straight from the models: the data migrations only write to 'default'
+        with override_settings(MIGRATION_MODULES={app.label: None for app in apps.get_app_configs()}):
+            call_command('migrate', database=ALIAS, run_syncdb=True, verbosity=0)
+        category = Category.objects.using(ALIAS).create(name='Benchmark')
+        products = Product.objects.using(ALIAS).bulk_create([
+            Product(name=f"Product {i}", price=Decimal('5000.00'), in_stock=100, description='', category=category)
+            for i in range(50)
+        ])
+        product_ids = [product.pk for product in products]
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+
+        latencies, errors, reads = [], [], []
+        writing = threading.Event()
+        writing.set()
+        writers = [
+            threading.Thread(target=self._write, args=(number, options['requests'], product_ids, latencies, errors))
+            for number in range(options['writers'])
+        ]
+        readers = [threading.Thread(target=self._read, args=(writing, reads)) for _ in range(options['readers'])]
+        started = time.monotonic()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.monotonic() - started
+        writing.clear()
+        for thread in readers:
+            thread.join()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        self.stdout.write(
+            f"{label:<8} journal={journal_mode:<7} {len(latencies) / elapsed:8.1f} writes/s  "
+            f"p95 {p95:7.1f} ms  {len(errors)} failed  {sum(reads) / elapsed:8.1f} reads/s"
+        )
+        for message in sorted(set(errors)):
+            self.stdout.write(f"         {errors.count(message)} x {message}")
+
+    def _write(self, number, requests, product_ids, latencies, errors):
+        # One anonymous add-to-cart: read the cart, add or bump a line, then save the session
+        session_key = f'benchmark-{number}'
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                try:
+                    with db_transaction.atomic(using=ALIAS):
+                        cart, _ = Cart.objects.using(ALIAS).get_or_create(session_key=session_key, user=None)
+                        item, created = CartItem.objects.using(ALIAS).get_or_create(
+                            cart=cart, product_id=random.choice(product_ids), defaults={'quantity': 1},
+                        )
+                        if not created:
+                            CartItem.objects.using(ALIAS).filter(pk=item.pk).update(quantity=F('quantity') + 1)
+                    Session.objects.using(ALIAS).update_or_create(
+                        session_key=session_key,
+                        defaults={'session_data': '', 'expire_date': timezone.now() + timedelta(days=14)},
+                    )
+                except OperationalError as e:
+                    errors.append(str(e))
+                    continue
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections[ALIAS].close()
+
+    def _read(self, writing, reads):
+        count = 0
+        try:
+            while writing.is_set():
+                try:
+                    list(Product.objects.using(ALIAS).filter(is_active=True).order_by('name')[:24])
+                    count += 1
+                except OperationalError:
+                    pass
+        finally:
+            reads.append(count)
+            connections[ALIAS].close()
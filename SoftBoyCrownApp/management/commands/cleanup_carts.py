@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from SoftBoyCrownApp.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned anonymous carts (and their items) and expired sessions in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help="Only remove anonymous carts older than this many hours (default: 24).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows deleted per transaction (default: 500).")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between batches so other writers can get the lock.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        # An anonymous cart is abandoned once its session is gone or expired.
+        live_session = Session.objects.filter(session_key=OuterRef('session_key'), expire_date__gte=now)
+        carts = Cart.objects.filter(
+            user__isnull=True,
+            created_at__lt=now - timedelta(hours=options['grace_hours']),
+        ).exclude(Exists(live_session))
+        sessions = Session.objects.filter(expire_date__lt=now)
+
+        if dry_run:
+            self.stdout.write(f"Abandoned carts: {carts.count()}")
+            self.stdout.write(f"Cart items: {CartItem.objects.filter(cart__in=carts).count()}")
+            self.stdout.write(f"Expired sessions: {sessions.count()}")
+            self.stdout.write(self.style.WARNING("Dry run, nothing deleted."))
+            return
+
+        started = time.monotonic()
+        cart_count, item_count = self._delete_carts(carts, batch_size, options['pause'])
+        carts_done = time.monotonic()
+        session_count = self._delete_sessions(sessions, batch_size, options['pause'])
+        finished = time.monotonic()
+
+        self.stdout.write(f"Deleted {cart_count} carts and {item_count} cart items in {carts_done - started:.2f}s")
+        self.stdout.write(f"Deleted {session_count} expired sessions in {finished - carts_done:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Cleanup finished in {finished - started:.2f}s"))
+
+    def _delete_carts(self, carts, batch_size, pause):
+        cart_count = item_count = 0
+        last_pk = 0
+        while True:
+            ids = list(carts.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                item_count += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                Cart.products.through.objects.filter(cart_id__in=ids).delete()
+                cart_count += Cart.objects.filter(pk__in=ids).delete()[0]
+            last_pk = ids[-1]
+            if pause:
+                time.sleep(pause)
+        return cart_count, item_count
+
+    def _delete_sessions(self, sessions, batch_size, pause):
+        deleted = 0
+        while True:
+            keys = list(sessions.order_by('session_key').values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+            with transaction.atomic():
+                deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if pause:
+                time.sleep(pause)
+        return deleted
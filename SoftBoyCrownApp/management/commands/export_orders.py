@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from SoftBoyCrownApp.exports import CHUNK_SIZE, FORMATS, export_rows
+from SoftBoyCrownApp.models import Transaction
+
+
+class Command(BaseCommand):
+    help = "Stream transactions with their address and order lines as CSV or JSON lines, one row per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--since', help="Only transactions made at or after this ISO timestamp.")
+        parser.add_argument('--until', help="Only transactions made before this ISO timestamp.")
+        parser.add_argument('--status', choices=[choice for choice, _ in Transaction.TRANSACTION_STATUS_CHOICES],
+                            help="Only transactions with this status.")
+        parser.add_argument('--output', '-o', help="File to write to (default: standard output).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f"Transactions read from the database at a time (default: {CHUNK_SIZE}).")
+
+    def handle(self, *args, **options):
+        transactions = Transaction.objects.all()
+        for option, lookup in (('since', 'transaction_date__gte'), ('until', 'transaction_date__lt')):
+            if options[option]:
+                value = parse_datetime(options[option])
+                if value is None:
+                    raise CommandError(f"--{option} must be an ISO timestamp, got {options[option]!r}")
+                transactions = transactions.filter(**{lookup: value})
+        if options['status']:
+            transactions = transactions.filter(transaction_status=options['status'])
+
+        lines, _ = FORMATS[options['format']]
+        rows = export_rows(transactions, chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines(rows))
+        else:
+            for line in lines(rows):
+                self.stdout.write(line, ending='')
@@ -0,0 +1,175 @@
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+logger = logging.getLogger(__name__)
+
+
+class FakeGateway:
+    """In-memory charges plus the knobs the request handler reads."""
+
+    def __init__(self, latency, failure_rate, webhook_url, webhook_delay, charge_failure_rate, secret_hash):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.webhook_url = webhook_url
+        self.webhook_delay = webhook_delay
+        self.charge_failure_rate = charge_failure_rate
+        self.secret_hash = secret_hash
+        self.charges = {}
+        self.charges_by_ref = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(random.randint(1000000, 9000000))
+        self.session = requests.Session()
+
+    def create_charge(self, tx_ref, amount, currency='NGN', status=None):
+        if status is None:
+            status = 'failed' if random.random() < self.charge_failure_rate else 'successful'
+        with self.lock:
+            charge = {
+                'id': next(self.ids),
+                'tx_ref': tx_ref,
+                'flw_ref': f"FAKE-FLW-{tx_ref}",
+                'amount': amount,
+                'charged_amount': amount,
+                'currency': currency,
+                'status': status,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+            }
+            self.charges[charge['id']] = charge
+            self.charges_by_ref[tx_ref] = charge
+        if self.webhook_url:
+            threading.Thread(target=self.send_webhook, args=(charge,), daemon=True).start()
+        return charge
+
+    def send_webhook(self, charge):
+        time.sleep(self.webhook_delay)
+        try:
+            self.session.post(
+                self.webhook_url,
+                json={'event': 'charge.completed', 'data': charge},
+                headers={'verif-hash': self.secret_hash},
+                timeout=10,
+            )
+        except requests.RequestException as e:
+            logger.warning("Webhook delivery for %s failed: %s", charge['tx_ref'], e)
+
+
+class FakeFlutterwaveHandler(BaseHTTPRequestHandler):
+    verify_path = re.compile(r'^/v3/transactions/(\d+)/verify$')
+
+    @property
+    def gateway(self):
+        return self.server.gateway
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _simulate_upstream(self):
+        """Apply configured latency; returns False if this call should fail."""
+        if self.gateway.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.gateway.latency)
+        if random.random() < self.gateway.failure_rate:
+            self._send_json(503, {'status': 'error', 'message': 'Service temporarily unavailable', 'data': None})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._send_json(401, {'status': 'error', 'message': 'Authorization required', 'data': None})
+        match = self.verify_path.match(url.path)
+        if url.path == '/v3/transactions/verify_by_reference':
+            tx_ref = parse_qs(url.query).get('tx_ref', [''])[0]
+            if not self._simulate_upstream():
+                return
+            charge = self.gateway.charges_by_ref.get(tx_ref)
+        elif match:
+            if not self._simulate_upstream():
+                return
+            charge = self.gateway.charges.get(int(match.group(1)))
+        else:
+            return self._send_json(404, {'status': 'error', 'message': 'Not found', 'data': None})
+        if charge is None:
+            return self._send_json(400, {'status': 'error', 'message': 'No transaction was found for this id', 'data': None})
+        return self._send_json(200, {'status': 'success', 'message': 'Transaction fetched successfully', 'data': charge})
+
+    def do_POST(self):
+        # Test helper, not part of the Flutterwave API: create a charge for a
+        # tx_ref as if the customer had just paid, then fire its webhook.
+        if urlparse(self.path).path != '/_fake/charges':
+            return self._send_json(404, {'status': 'error', 'message': 'Not found', 'data': None})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            charge = self.gateway.create_charge(
+                body['tx_ref'], float(body['amount']), body.get('currency', 'NGN'), body.get('status'),
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send_json(400, {'status': 'error', 'message': f"Invalid charge: {e}", 'data': None})
+        return self._send_json(201, {'status': 'success', 'data': charge})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local stand-in for the Flutterwave API. Serves /v3/transactions/<id>/verify and "
+        "/v3/transactions/verify_by_reference, and accepts POST /_fake/charges {tx_ref, amount} "
+        "to create a charge and send its signed charge.completed webhook. Point "
+        "FLUTTERWAVE_BASE_URL at it to load-test offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help="Mean API latency in milliseconds (uniformly jittered +/-50%%).")
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help="Fraction of API calls answered with HTTP 503 (0-1).")
+        parser.add_argument('--webhook-url', default='',
+                            help="Where to POST charge.completed webhooks, e.g. http://127.0.0.1:8000/payment-callback/.")
+        parser.add_argument('--webhook-delay', type=float, default=0.0,
+                            help="Milliseconds to wait before sending each webhook.")
+        parser.add_argument('--charge-failure-rate', type=float, default=0.0,
+                            help="Fraction of created charges that end up 'failed' (0-1).")
+        parser.add_argument('--secret-hash', default=None,
+                            help="verif-hash header value (default: settings.FLUTTERWAVE_SECRET_HASH).")
+        parser.add_argument('--verbose', action='store_true', help="Log every request.")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), FakeFlutterwaveHandler)
+        server.daemon_threads = True
+        server.verbose = options['verbose']
+        server.gateway = FakeGateway(
+            latency=options['latency'] / 1000,
+            failure_rate=options['failure_rate'],
+            webhook_url=options['webhook_url'],
+            webhook_delay=options['webhook_delay'] / 1000,
+            charge_failure_rate=options['charge_failure_rate'],
+            secret_hash=options['secret_hash'] if options['secret_hash'] is not None else settings.FLUTTERWAVE_SECRET_HASH,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Flutterwave listening on http://{options['host']}:{server.server_port}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from SoftBoyCrownApp.catalog import IMAGE_WORKERS, CatalogError, import_catalog, read_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert categories, sizes, colors and products from a CSV or JSON catalog. "
+        "Products are matched on sku; sizes, colors, variants ('M/Black=3') and images are separated by '|' in CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file (.csv or .json).")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Override the format implied by the extension.")
+        parser.add_argument('--image-workers', type=int, default=IMAGE_WORKERS,
+                            help=f"Images fetched in parallel (default: {IMAGE_WORKERS}).")
+        parser.add_argument('--image-dir', default=settings.CATALOG_IMAGE_DIR,
+                            help="Directory local image paths are read from, relative to it "
+                                 "(default: CATALOG_IMAGE_DIR; without one only http(s) URLs are fetched).")
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_catalog(options['path'], options['format'])
+        except (CatalogError, OSError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        report = import_catalog(rows, image_workers=options['image_workers'], image_dir=options['image_dir'])
+        for error in report['errors']:
+            self.stderr.write(error)
+        if report['emptied_variants']:
+            self.stderr.write(f"{report['emptied_variants']} variants missing from the catalog now have no stock")
+        imported = report['created'] + report['updated']
+        rate = imported / report['database_seconds'] if report['database_seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} products ({report['created']} new, {report['updated']} updated) "
+            f"in {report['database_seconds']:.2f}s ({rate:.0f}/s); "
+            f"{report['images']} images attached; {len(report['errors'])} errors; "
+            f"{report['seconds']:.2f}s total"
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SoftBoyCrownApp.webhooks import process_pending
+
+
+class Command(BaseCommand):
+    help = "Process Flutterwave webhooks stored in the WebhookEvent inbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Events claimed per batch (default: 100).")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling the inbox instead of exiting when it is empty.")
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="Seconds to wait between polls in --loop mode (default: 2).")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            handled = process_pending(options['batch_size'])
+            total += handled
+            if handled:
+                self.stdout.write(f"Processed {handled} webhook events")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} webhook events processed"))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SoftBoyCrownApp.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every CustomerOrderSummary row from the Transaction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Customers recomputed per batch (default: 1000).")
+        parser.add_argument('--user', type=int, nargs='+', dest='user_ids',
+                            help="Only recompute these user ids.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild_summaries(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} order summaries in {time.monotonic() - started:.2f}s"
+        ))
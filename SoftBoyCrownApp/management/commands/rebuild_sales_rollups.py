@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from SoftBoyCrownApp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailySales and DailyProductSales rollups from Transactions and OrderItems."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First date to rebuild (YYYY-MM-DD). Default: every date with orders.")
+        parser.add_argument('--until', help="Last date to rebuild, inclusive (YYYY-MM-DD; default: today). Requires --since.")
+        parser.add_argument('--batch-days', type=int, default=31,
+                            help="Days recomputed per batch when rebuilding everything (default: 31).")
+
+    def handle(self, *args, **options):
+        dates = None
+        if options['since']:
+            since = parse_date(options['since'])
+            until = parse_date(options['until']) if options['until'] else timezone.localdate()
+            if since is None or until is None or until < since:
+                raise CommandError("--since and --until must be dates (YYYY-MM-DD), with --until not before --since")
+            dates = [since + timedelta(days=n) for n in range((until - since).days + 1)]
+        elif options['until']:
+            raise CommandError("--until requires --since")
+
+        started = time.monotonic()
+        rebuilt = rebuild_rollups(dates, batch_days=options['batch_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt sales rollups for {rebuilt} days in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,109 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from SoftBoyCrownApp.models import Transaction
+from SoftBoyCrownApp.orders import (
+    OPEN_STATUSES,
+    InsufficientStock,
+    decline_transaction,
+    finalise_transaction,
+    is_verified_payment,
+)
+from SoftBoyCrownApp.payments import GatewayError, get_client, verify_transaction_by_reference
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify pending/processing transactions whose callback never arrived against Flutterwave "
+        "and approve or decline them through the same code as payment_callback."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15,
+                            help="Only look at transactions older than this many minutes (default: 15).")
+        parser.add_argument('--abandon-after', type=int, default=24,
+                            help="Decline transactions Flutterwave has no payment for after this many hours (default: 24).")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Transactions loaded per batch (default: 100).")
+        parser.add_argument('--workers', type=int, default=8,
+                            help="Concurrent verification requests (default: 8).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Verify and report, but do not change any transaction.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        abandon_before = now - timedelta(hours=options['abandon_after'])
+        stale = Transaction.objects.filter(
+            transaction_status__in=OPEN_STATUSES,
+            transaction_date__lt=now - timedelta(minutes=options['older_than']),
+        ).order_by('pk')
+
+        outcomes = Counter()
+        started = time.monotonic()
+        last_pk = 0
+        # Only the gateway calls run in the pool; results are applied on this
+        # thread so database writes stay serialised.
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(stale.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                for transaction, response in zip(batch, pool.map(self._verify, batch)):
+                    outcome = self._apply(transaction, response, abandon_before, options['dry_run'])
+                    outcomes[outcome] += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{transaction.tx_ref}: {outcome}")
+
+        elapsed = time.monotonic() - started
+        total = sum(outcomes.values())
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{outcome}: {count}")
+        self.stdout.write(f"Gateway: {get_client().metrics()}")
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {total} transactions in {elapsed:.2f}s ({rate:.1f}/s)"
+            + (" [dry run]" if options['dry_run'] else "")
+        ))
+
+    def _verify(self, transaction):
+        try:
+            return verify_transaction_by_reference(transaction.tx_ref)
+        except GatewayError as e:
+            return e
+
+    def _apply(self, transaction, response, abandon_before, dry_run):
+        if isinstance(response, GatewayError):
+            return 'gateway error'
+        data = response.get('data') or {}
+
+        if is_verified_payment(transaction, response):
+            if dry_run:
+                return 'would approve'
+            try:
+                approved = finalise_transaction(transaction, str(data.get('id')))
+            except InsufficientStock:
+                return 'declined (out of stock)'
+            return 'approved' if approved else 'already settled'
+
+        paid_status = data.get('status')
+        if paid_status in ['failed', 'cancelled'] or (
+            response.get('status') == 'success' and paid_status in ['successful', 'completed']
+        ):
+            # Failed at the gateway, or paid with the wrong amount/currency
+            if dry_run:
+                return 'would decline'
+            return 'declined' if decline_transaction(transaction) else 'already settled'
+
+        not_found = response.get('status') == 'error' and 'no transaction' in (response.get('message') or '').lower()
+        if not_found and transaction.transaction_date < abandon_before:
+            # Flutterwave has never seen a payment for this reference
+            if dry_run:
+                return 'would decline (abandoned)'
+            return 'declined (abandoned)' if decline_transaction(transaction) else 'already settled'
+        return 'still pending'
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SoftBoyCrownApp.orders import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Delete expired checkout stock reservations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Reservations deleted per statement (default: 1000).")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep sweeping instead of exiting after one pass.")
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help="Seconds to wait between sweeps in --loop mode (default: 60).")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            removed = release_expired_reservations(options['batch_size'])
+            self.stdout.write(f"Released {removed} expired reservations in {time.monotonic() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,110 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from SoftBoyCrownApp.models import WebhookEvent, WebhookJournalEntry
+from SoftBoyCrownApp.webhooks import parse_webhook, process_event, record_webhooks
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-drive journalled webhook requests through the inbox and processing pipeline. "
+        "Use after an outage to recover webhooks that were received but never processed, "
+        "or against a copy of the database to measure processing throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only entries received at or after this ISO timestamp.")
+        parser.add_argument('--until', help="Only entries received before this ISO timestamp.")
+        parser.add_argument('--id', type=int, nargs='+', dest='ids', help="Only these journal entry ids.")
+        parser.add_argument('--tx-ref', help="Only entries for this transaction reference.")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Journal entries decoded and recorded per batch (default: 200).")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Threads processing each batch's events (default: 4).")
+        parser.add_argument('--reprocess', action='store_true',
+                            help="Also re-run events that were already processed or failed.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Decode and count entries without recording or processing them.")
+
+    def handle(self, *args, **options):
+        entries = WebhookJournalEntry.objects.order_by('pk')
+        for option, lookup in (('since', 'received_at__gte'), ('until', 'received_at__lt')):
+            if options[option]:
+                value = parse_datetime(options[option])
+                if value is None:
+                    raise CommandError(f"--{option} must be an ISO timestamp, got {options[option]!r}")
+                entries = entries.filter(**{lookup: value})
+        if options['ids']:
+            entries = entries.filter(pk__in=options['ids'])
+
+        outcomes = Counter()
+        started = time.monotonic()
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(entries.filter(pk__gt=last_pk).only('body')[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                payloads = []
+                for entry in batch:
+                    webhook_data = parse_webhook(entry.raw_body())
+                    if webhook_data is None:
+                        outcomes['malformed'] += 1
+                    elif options['tx_ref'] and webhook_data['data']['tx_ref'] != options['tx_ref']:
+                        continue
+                    else:
+                        payloads.append(webhook_data)
+                if options['dry_run']:
+                    outcomes['would replay'] += len(payloads)
+                    continue
+                if not payloads:
+                    continue
+
+                record_webhooks(payloads)
+                keys = Q()
+                for webhook_data in payloads:
+                    keys |= Q(event=webhook_data['event'], flw_transaction_id=str(webhook_data['data']['id']))
+                events = WebhookEvent.objects.filter(keys)
+                if options['reprocess']:
+                    events.exclude(status='pending').update(status='pending', locked_at=None, attempts=0)
+                else:
+                    events = events.filter(status='pending')
+                events = list(events)
+                if len(events) < len(payloads):
+                    outcomes['already processed'] += len(payloads) - len(events)
+
+                # Each worker takes a slice of the batch on its own connection
+                slices = [events[i::options['workers']] for i in range(options['workers'])]
+                for result in pool.map(self._process, slices):
+                    outcomes.update(result)
+
+        elapsed = time.monotonic() - started
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{outcome}: {count}")
+        total = sum(outcomes.values())
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {total} journal entries in {elapsed:.2f}s ({rate:.1f}/s)"
+            + (" [dry run]" if options['dry_run'] else "")
+        ))
+
+    def _process(self, events):
+        result = Counter()
+        try:
+            for event in events:
+                if process_event(event):
+                    event.refresh_from_db(fields=['status'])
+                    result[event.status] += 1
+                else:
+                    result['claimed elsewhere'] += 1
+        finally:
+            connection.close()
+        return result
@@ -0,0 +1,45 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from SoftBoyCrownApp.emails import send_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued OutboundEmail rows over one persistent SMTP connection. To try it against a "
+        "local sink, run e.g. `python -m aiosmtpd -n -l localhost:1025` and set EMAIL_HOST=localhost "
+        "EMAIL_PORT=1025."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Emails claimed per batch (default: 50).")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling the outbox instead of exiting when nothing is due.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to wait between polls in --loop mode (default: 5).")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        started = time.monotonic()
+        connection = get_connection()
+        try:
+            while True:
+                sent, failed = send_pending(connection, options['batch_size'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent} emails, {failed} failed")
+                    continue
+                if not options['loop']:
+                    break
+                # Don't hold the SMTP session open while idle
+                connection.close()
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.monotonic() - started:.2f}s: {total_sent} sent, {total_failed} failed"
+        ))
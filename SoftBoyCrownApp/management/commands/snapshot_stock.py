@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SoftBoyCrownApp.ledger import drift, take_snapshots
+from SoftBoyCrownApp.models import Product, ProductVariant
+
+
+class Command(BaseCommand):
+    help = (
+        "Store a stock snapshot batch from the stock movement ledger, so balances can be "
+        "computed from the latest snapshot plus a short scan of newer movements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep taking snapshots instead of exiting after one.")
+        parser.add_argument('--interval', type=float, default=3600.0,
+                            help="Seconds between snapshots in --loop mode (default: 3600).")
+        parser.add_argument('--check', action='store_true',
+                            help="Instead of snapshotting, list counters whose live stock differs from the ledger.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self._check()
+        while True:
+            started = time.monotonic()
+            written = take_snapshots()
+            self.stdout.write(f"Snapshot of {written} stock counters in {time.monotonic() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def _check(self):
+        mismatched = drift()
+        names = dict(Product.objects.filter(pk__in={key[0] for key in mismatched}).values_list('pk', 'name'))
+        variants = {
+            variant.pk: str(variant)
+            for variant in ProductVariant.objects.filter(pk__in={key[1] for key in mismatched if key[1]})
+            .select_related('product', 'size', 'color')
+        }
+        for (product_id, variant_id), (ledger, live) in sorted(mismatched.items(), key=lambda row: (row[0][0], row[0][1] or 0)):
+            label = variants.get(variant_id) if variant_id else names.get(product_id)
+            self.stdout.write(f"{label}: ledger {ledger}, live {live}")
+        if mismatched:
+            self.stdout.write(self.style.WARNING(f"{len(mismatched)} stock counters differ from the ledger"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Live stock matches the ledger"))
@@ -0,0 +1,59 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more queries than settings.QUERY_BUDGET allows."""
+
+
+class _QueryStats:
+    # A connection.execute_wrapper that counts and times what goes through it
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries each request runs, and how long they take. Over
+    QUERY_BUDGET it logs a warning in DEBUG, or raises QueryBudgetExceeded
+    when QUERY_BUDGET_RAISE is set (as QueryBudgetTestRunner does).
+    Does nothing otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        budget = settings.QUERY_BUDGET
+        strict = settings.QUERY_BUDGET_RAISE
+        if not budget or not (strict or settings.DEBUG):
+            return self.get_response(request)
+
+        stats = _QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        if stats.count > budget:
+            message = (
+                f"{request.method} {request.path} ran {stats.count} queries "
+                f"({stats.seconds * 1000:.1f} ms); the budget is {budget}"
+            )
+            if strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        else:
+            logger.debug("%s %s ran %d queries (%.1f ms)", request.method, request.path, stats.count, stats.seconds * 1000)
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-19 18:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.PositiveIntegerField(default=0, help_text='Number of items in stock for this size/color')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, help_text='Leave empty to use the product price', max_digits=10, null=True)),
+                ('color', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='SoftBoyCrownApp.color')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='SoftBoyCrownApp.product')),
+                ('size', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='SoftBoyCrownApp.size')),
+            ],
+            options={
+                'verbose_name': 'Product Variant',
+                'verbose_name_plural': 'Product Variants',
+            },
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cart_items', to='SoftBoyCrownApp.productvariant'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='SoftBoyCrownApp.productvariant'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['product', 'size', 'color', 'stock', 'price'], name='variant_lookup_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productvariant',
+            constraint=models.UniqueConstraint(fields=('product', 'size', 'color'), name='unique_product_variant'),
+        ),
+    ]
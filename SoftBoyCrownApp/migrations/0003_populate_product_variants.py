@@ -0,0 +1,46 @@
+from itertools import product as cross_product
+
+from django.db import migrations
+
+
+def create_variants(apps, schema_editor):
+    Product = apps.get_model('SoftBoyCrownApp', 'Product')
+    ProductVariant = apps.get_model('SoftBoyCrownApp', 'ProductVariant')
+    CartItem = apps.get_model('SoftBoyCrownApp', 'CartItem')
+    OrderItem = apps.get_model('SoftBoyCrownApp', 'OrderItem')
+
+    # Only a product with a single size/color pair can move its stock onto a
+    # variant as is. The rest keep product-level stock (which add_to_cart and
+    # checkout still honour) until an admin enters the per-variant counts.
+    variants = []
+    for product in Product.objects.prefetch_related('sizes', 'colors'):
+        combos = list(cross_product(product.sizes.all() or [None], product.colors.all() or [None]))
+        if len(combos) == 1 and combos[0] != (None, None):
+            size, color = combos[0]
+            variants.append(ProductVariant(product=product, size=size, color=color, stock=product.in_stock))
+    ProductVariant.objects.bulk_create(variants, ignore_conflicts=True)
+
+    lookup = {
+        (v.product_id, v.size_id, v.color_id): v.pk
+        for v in ProductVariant.objects.all()
+    }
+    for model in (CartItem, OrderItem):
+        items = list(model.objects.filter(variant__isnull=True))
+        for item in items:
+            item.variant_id = lookup.get((item.product_id, item.size_id, item.color_id))
+        model.objects.bulk_update([item for item in items if item.variant_id], ['variant'])
+
+
+def remove_variants(apps, schema_editor):
+    apps.get_model('SoftBoyCrownApp', 'ProductVariant').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0002_productvariant'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_variants, remove_variants),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0003_populate_product_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zone', models.CharField(choices=[('abuja', 'Abuja / FCT'), ('nigeria', 'Other Nigerian states'), ('international', 'International')], max_length=20, unique=True)),
+                ('fee', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+            options={
+                'verbose_name': 'Shipping Rate',
+                'verbose_name_plural': 'Shipping Rates',
+            },
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='shipping_zone',
+            field=models.CharField(blank=True, editable=False, help_text='Normalised shipping zone, derived from country and state on save', max_length=20),
+        ),
+    ]
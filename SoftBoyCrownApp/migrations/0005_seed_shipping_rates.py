@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+# Frozen copies of shipping.DEFAULT_RATES and shipping.zone_for as they were
+# when this ran, so later changes to shipping.py don't alter the migration
+DEFAULT_RATES = {
+    'abuja': Decimal('2000'),
+    'nigeria': Decimal('5000'),
+    'international': Decimal('15000'),
+}
+
+ABUJA_STATES = frozenset(['abuja', 'federal capital territory', 'fct'])
+
+
+def zone_for(country, state):
+    country = (country or '').strip().lower()
+    state = (state or '').strip().lower()
+    if country == 'nigeria':
+        return 'abuja' if state in ABUJA_STATES else 'nigeria'
+    return 'international'
+
+
+def seed_rates(apps, schema_editor):
+    ShippingRate = apps.get_model('SoftBoyCrownApp', 'ShippingRate')
+    Address = apps.get_model('SoftBoyCrownApp', 'Address')
+
+    ShippingRate.objects.bulk_create(
+        [ShippingRate(zone=zone, fee=fee) for zone, fee in DEFAULT_RATES.items()],
+        ignore_conflicts=True,
+    )
+    addresses = list(Address.objects.only('country', 'state'))
+    for address in addresses:
+        address.shipping_zone = zone_for(address.country, address.state)
+    Address.objects.bulk_update(addresses, ['shipping_zone'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0004_shippingrate'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 18:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0007_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='SoftBoyCrownApp.product')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='SoftBoyCrownApp.transaction')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='SoftBoyCrownApp.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Stock Reservation',
+                'verbose_name_plural': 'Stock Reservations',
+                'ordering': ['expires_at'],
+                'indexes': [models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_product_idx'), models.Index(fields=['variant', 'expires_at', 'quantity'], name='reservation_variant_idx'), models.Index(fields=['expires_at'], name='reservation_expiry_idx')],
+            },
+        ),
+    ]
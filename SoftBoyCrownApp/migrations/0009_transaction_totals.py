@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='shipping_fee',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='subtotal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    Transaction = apps.get_model('SoftBoyCrownApp', 'Transaction')
+    OrderItem = apps.get_model('SoftBoyCrownApp', 'OrderItem')
+
+    line_total = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2))
+    subtotals = dict(
+        OrderItem.objects.values('transaction_id').annotate(total=Sum(line_total)).values_list('transaction_id', 'total')
+    )
+    transactions = list(Transaction.objects.filter(pk__in=subtotals, subtotal__isnull=True).only('amount'))
+    for transaction in transactions:
+        transaction.subtotal = subtotals[transaction.pk]
+        transaction.shipping_fee = transaction.amount - transaction.subtotal
+    Transaction.objects.bulk_update(transactions, ['subtotal', 'shipping_fee'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0009_transaction_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
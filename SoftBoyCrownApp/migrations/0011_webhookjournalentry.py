@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0010_backfill_transaction_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookJournalEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('remote_addr', models.GenericIPAddressField(blank=True, null=True)),
+                ('body', models.BinaryField(help_text='zlib-compressed request body')),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed body size in bytes')),
+            ],
+            options={
+                'verbose_name': 'Webhook Journal Entry',
+                'verbose_name_plural': 'Webhook Journal',
+                'ordering': ['-received_at'],
+            },
+        ),
+    ]
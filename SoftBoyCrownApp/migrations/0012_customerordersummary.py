@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0011_webhookjournalentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_orders', models.PositiveIntegerField(default=0, help_text='Pending or processing')),
+                ('approved_orders', models.PositiveIntegerField(default=0)),
+                ('declined_orders', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, help_text='Total of approved orders', max_digits=12)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Customer Order Summary',
+                'verbose_name_plural': 'Customer Order Summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum
+
+OPEN_STATUSES = ('pending', 'processing')
+
+
+def populate_summaries(apps, schema_editor):
+    Transaction = apps.get_model('SoftBoyCrownApp', 'Transaction')
+    CustomerOrderSummary = apps.get_model('SoftBoyCrownApp', 'CustomerOrderSummary')
+
+    rows = Transaction.objects.exclude(user=None).values('user_id').annotate(
+        open_orders=Count('pk', filter=Q(transaction_status__in=OPEN_STATUSES)),
+        approved_orders=Count('pk', filter=Q(transaction_status='approved')),
+        declined_orders=Count('pk', filter=Q(transaction_status='declined')),
+        lifetime_spend=Sum('amount', filter=Q(transaction_status='approved')),
+        last_order_at=Max('transaction_date'),
+    )
+    CustomerOrderSummary.objects.bulk_create([
+        CustomerOrderSummary(
+            user_id=row['user_id'],
+            open_orders=row['open_orders'],
+            approved_orders=row['approved_orders'],
+            declined_orders=row['declined_orders'],
+            lifetime_spend=row['lifetime_spend'] or 0,
+            last_order_at=row['last_order_at'],
+        )
+        for row in rows
+    ], batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0012_customerordersummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
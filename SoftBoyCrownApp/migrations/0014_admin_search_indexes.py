@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 18:42
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0013_populate_order_summaries'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(django.db.models.functions.comparison.Collate('full_name', 'NOCASE'), name='address_full_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(django.db.models.functions.comparison.Collate('city', 'NOCASE'), name='address_city_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(django.db.models.functions.comparison.Collate('postal_code', 'NOCASE'), name='address_postal_code_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(django.db.models.functions.comparison.Collate('phone_number', 'NOCASE'), name='address_phone_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(django.db.models.functions.comparison.Collate('session_key', 'NOCASE'), name='cart_session_key_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('username', 'NOCASE'), name='user_username_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='product_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-transaction_date'], name='transaction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(django.db.models.functions.comparison.Collate('tx_ref', 'NOCASE'), name='transaction_tx_ref_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(django.db.models.functions.comparison.Collate('flw_transaction_id', 'NOCASE'), name='transaction_flw_id_ci_idx'),
+        ),
+    ]
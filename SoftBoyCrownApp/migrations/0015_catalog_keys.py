@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 18:48
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    # Category names become unique; keep the oldest of each name
+    Category = apps.get_model('SoftBoyCrownApp', 'Category')
+    Product = apps.get_model('SoftBoyCrownApp', 'Product')
+    duplicated = Category.objects.exclude(name=None).values('name').annotate(n=Count('pk')).filter(n__gt=1)
+    for row in duplicated:
+        keep, *extra = Category.objects.filter(name=row['name']).order_by('pk').values_list('pk', flat=True)
+        Product.objects.filter(category_id__in=extra).update(category_id=keep)
+        Category.objects.filter(pk__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0014_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Supplier code; catalog imports match products on it', max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-19 18:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0015_catalog_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('approved', 'Approved'), ('declined', 'Declined')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Order totals, shipping included', max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='daily_sales_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('approved', 'Approved'), ('declined', 'Declined')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Line totals', max_digits=14)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales', to='SoftBoyCrownApp.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='SoftBoyCrownApp.product')),
+            ],
+            options={
+                'verbose_name': 'Daily Product Sales',
+                'verbose_name_plural': 'Daily Product Sales',
+                'indexes': [models.Index(fields=['date', 'status', 'category'], name='daily_product_sales_cat_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'status'), name='daily_product_sales_unique')],
+            },
+        ),
+    ]
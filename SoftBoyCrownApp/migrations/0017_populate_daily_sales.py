@@ -0,0 +1,55 @@
+from django.db import migrations
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+OPEN_STATUSES = ('pending', 'processing')
+
+
+def _bucket(field):
+    return Case(When(**{f'{field}__in': OPEN_STATUSES}, then=Value('open')), default=F(field))
+
+
+def populate_daily_sales(apps, schema_editor):
+    Transaction = apps.get_model('SoftBoyCrownApp', 'Transaction')
+    OrderItem = apps.get_model('SoftBoyCrownApp', 'OrderItem')
+    DailySales = apps.get_model('SoftBoyCrownApp', 'DailySales')
+    DailyProductSales = apps.get_model('SoftBoyCrownApp', 'DailyProductSales')
+
+    lines = OrderItem.objects.annotate(
+        day=TruncDate('transaction__transaction_date'), bucket=_bucket('transaction__transaction_status'),
+    )
+    units = {
+        (row['day'], row['bucket']): row['units']
+        for row in lines.values('day', 'bucket').annotate(units=Sum('quantity'))
+    }
+    DailySales.objects.bulk_create([
+        DailySales(
+            date=row['day'], status=row['bucket'], orders=row['orders'], revenue=row['revenue'],
+            units=units.get((row['day'], row['bucket'])) or 0,
+        )
+        for row in Transaction.objects.annotate(
+            day=TruncDate('transaction_date'), bucket=_bucket('transaction_status'),
+        ).values('day', 'bucket').annotate(orders=Count('pk'), revenue=Sum('amount'))
+    ], batch_size=500)
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(
+            date=row['day'], product_id=row['product_id'], category_id=row['product__category_id'],
+            status=row['bucket'], orders=row['orders'], units=row['units'], revenue=row['revenue'],
+        )
+        for row in lines.values('day', 'product_id', 'product__category_id', 'bucket').annotate(
+            orders=Count('transaction_id', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0016_dailysales'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_daily_sales, migrations.RunPython.noop),
+    ]
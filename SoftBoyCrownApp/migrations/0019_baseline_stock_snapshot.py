@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def baseline_snapshot(apps, schema_editor):
+    # The ledger starts from today's stock; earlier history is unknown
+    Product = apps.get_model('SoftBoyCrownApp', 'Product')
+    ProductVariant = apps.get_model('SoftBoyCrownApp', 'ProductVariant')
+    StockSnapshot = apps.get_model('SoftBoyCrownApp', 'StockSnapshot')
+    now = timezone.now()
+    snapshots = [
+        StockSnapshot(product_id=pk, variant_id=None, quantity=in_stock, last_movement_id=0, taken_at=now)
+        for pk, in_stock in Product.objects.values_list('pk', 'in_stock')
+    ] + [
+        StockSnapshot(product_id=product_id, variant_id=pk, quantity=stock, last_movement_id=0, taken_at=now)
+        for pk, product_id, stock in ProductVariant.objects.values_list('pk', 'product_id', 'stock')
+    ]
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0018_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(baseline_snapshot, migrations.RunPython.noop),
+    ]
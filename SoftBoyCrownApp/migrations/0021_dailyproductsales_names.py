@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 19:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_names(apps, schema_editor):
+    DailyProductSales = apps.get_model('SoftBoyCrownApp', 'DailyProductSales')
+    Product = apps.get_model('SoftBoyCrownApp', 'Product')
+    Category = apps.get_model('SoftBoyCrownApp', 'Category')
+    DailyProductSales.objects.update(
+        product_name=Coalesce(Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('name')[:1]), Value('')),
+        category_name=Coalesce(Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0020_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='category_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(fill_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SoftBoyCrownApp', '0022_webhookevent_next_attempt_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='SoftBoyCrownApp.product'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='SoftBoyCrownApp.productvariant'),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_snapshots', to='SoftBoyCrownApp.product'),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='variant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_snapshots', to='SoftBoyCrownApp.productvariant'),
+        ),
+    ]
@@ -1,5 +1,9 @@
+import zlib
+
 from django.db import models
+from django.db.models.functions import Collate
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class Address(models.Model):
     full_name = models.CharField(max_length=100, blank=True, null=True)
@@ -9,13 +13,45 @@ class Address(models.Model):
     postal_code = models.CharField(max_length=20, blank=True, null=True)
     country = models.CharField(max_length=100, blank=True, null=True)
     phone_number = models.CharField(max_length=15, null=True, blank=True)
+    shipping_zone = models.CharField(max_length=20, blank=True, editable=False, help_text="Normalised shipping zone, derived from country and state on save")
 
     def __str__(self):
         return f"{self.full_name},{self.phone_number},{self.street}, {self.city}, {self.state}, {self.country}"
 
+    def save(self, *args, **kwargs):
+        from .shipping import zone_for
+        self.shipping_zone = zone_for(self.country, self.state)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'shipping_zone'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Address'
         verbose_name_plural = 'Addresses'
+        indexes = [
+            # NOCASE indexes let the admin's case-insensitive prefix searches (LIKE 'x%') use an index
+            models.Index(Collate('full_name', 'NOCASE'), name='address_full_name_ci_idx'),
+            models.Index(Collate('city', 'NOCASE'), name='address_city_ci_idx'),
+            models.Index(Collate('postal_code', 'NOCASE'), name='address_postal_code_ci_idx'),
+            models.Index(Collate('phone_number', 'NOCASE'), name='address_phone_ci_idx'),
+        ]
+
+
+class ShippingRate(models.Model):
+    ZONE_CHOICES = (
+        ('abuja', 'Abuja / FCT'),
+        ('nigeria', 'Other Nigerian states'),
+        ('international', 'International'),
+    )
+    zone = models.CharField(max_length=20, choices=ZONE_CHOICES, unique=True)
+    fee = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.get_zone_display()} - {self.fee}"
+
+    class Meta:
+        verbose_name = 'Shipping Rate'
+        verbose_name_plural = 'Shipping Rates'
         
 def get_default_category():
     return Category.objects.get_or_create(name="All Products")[0].id
@@ -39,11 +75,14 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(Collate('username', 'NOCASE'), name='user_username_ci_idx'),
+        ]
         
 
         
 class Category(models.Model):
-    name = models.CharField(max_length=100, blank=True, null=True)
+    name = models.CharField(max_length=100, blank=True, null=True, unique=True)
     description = models.TextField(blank=True, null=True)
 
     def __str__(self):
@@ -70,6 +109,7 @@ class Color(models.Model):
 from django_ckeditor_5.fields import CKEditor5Field
 
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="Supplier code; catalog imports match products on it")
     name = models.CharField(max_length=100, blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     slash_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -103,6 +143,53 @@ class Product(models.Model):
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(Collate('name', 'NOCASE'), name='product_name_ci_idx'),
+            # The shop lists active products by name, optionally within a category
+            models.Index(fields=['category', 'name'], condition=models.Q(is_active=True), name='product_active_category_idx'),
+            models.Index(fields=['name'], condition=models.Q(is_active=True), name='product_active_name_idx'),
+        ]
+
+class ProductVariantQuerySet(models.QuerySet):
+    def resolve(self, product, size_name=None, color_name=None):
+        """Return the variant matching the selected size/color names, or None."""
+        variants = self.select_related('size', 'color').filter(product=product)
+        if size_name:
+            variants = variants.filter(size__name__iexact=size_name)
+        else:
+            variants = variants.filter(size__isnull=True)
+        if color_name:
+            variants = variants.filter(color__name__iexact=color_name)
+        else:
+            variants = variants.filter(color__isnull=True)
+        return variants.first()
+
+
+class ProductVariant(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
+    size = models.ForeignKey(Size, on_delete=models.CASCADE, null=True, blank=True, related_name='variants')
+    color = models.ForeignKey(Color, on_delete=models.CASCADE, null=True, blank=True, related_name='variants')
+    stock = models.PositiveIntegerField(default=0, help_text="Number of items in stock for this size/color")
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Leave empty to use the product price")
+
+    objects = ProductVariantQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.product.name} ({self.size or 'No size'}, {self.color or 'No color'})"
+
+    def unit_price(self):
+        return self.price if self.price is not None else self.product.price
+
+    class Meta:
+        verbose_name = "Product Variant"
+        verbose_name_plural = "Product Variants"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'size', 'color'], name='unique_product_variant'),
+        ]
+        indexes = [
+            # Covers the add-to-cart lookup and stock check without touching the table
+            models.Index(fields=['product', 'size', 'color', 'stock', 'price'], name='variant_lookup_idx'),
+        ]
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
@@ -143,6 +230,12 @@ class Cart(models.Model):
     def total_price(self):
         return sum(item.total_price() for item in self.items.all())
 
+    class Meta:
+        indexes = [
+            # Anonymous visitors' carts are looked up by exact session key on every page
+            models.Index(fields=['session_key'], name='cart_session_key_idx'),
+            models.Index(Collate('session_key', 'NOCASE'), name='cart_session_key_ci_idx'),
+        ]
 
 
 class CartItem(models.Model):
@@ -151,14 +244,23 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     size = models.ForeignKey(Size, on_delete=models.SET_NULL, null=True, blank=True, help_text="Selected size for the cart item")
     color = models.ForeignKey(Color, on_delete=models.SET_NULL, null=True, blank=True, help_text="Selected color for the cart item")
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, related_name='cart_items')
 
     def __str__(self):
         if self.cart and self.cart.user:
             return f"{self.quantity} of {self.product.name} ({self.size}, {self.color}) in {self.cart.user.username}'s cart"
         return f"{self.quantity} of {self.product.name} ({self.size}, {self.color}) in an anonymous cart"
 
+    def unit_price(self):
+        if self.variant and self.variant.price is not None:
+            return self.variant.price
+        return self.product.price
+
+    def available_stock(self):
+        return self.variant.stock if self.variant else self.product.in_stock
+
     def total_price(self):
-        return self.product.price * self.quantity
+        return self.unit_price() * self.quantity
 
 # class Newsletter(models.Model):
 #     email = models.EmailField(unique=True)
@@ -199,6 +301,9 @@ class HomePageImages(models.Model):
 class Transaction(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='transactions', null=True, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Priced at checkout; amount == subtotal + shipping_fee. Empty on orders placed before they existed.
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    shipping_fee = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     products = models.ManyToManyField(Product, related_name='transactions')
     tx_ref = models.CharField(max_length=100, unique=True)
     flw_transaction_id = models.CharField(max_length=100, blank=True, null=True)
@@ -211,6 +316,8 @@ class Transaction(models.Model):
         ('approved', 'Approved'),
         ('declined', 'Declined'),
     )
+    # Statuses a transaction can still be approved or declined from
+    OPEN_STATUSES = ('pending', 'processing')
     transaction_status = models.CharField(max_length=20, choices=TRANSACTION_STATUS_CHOICES, default='pending')
     transaction_date = models.DateTimeField(auto_now_add=True)
 
@@ -221,6 +328,250 @@ class Transaction(models.Model):
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         ordering = ['-transaction_date']
+        indexes = [
+            models.Index(fields=['-transaction_date'], name='transaction_date_idx'),
+            # A customer's orders by status, newest first (profile page)
+            models.Index(fields=['user', 'transaction_status', '-transaction_date'], name='transaction_user_status_idx'),
+            # NOCASE indexes let the admin's case-insensitive prefix searches (LIKE 'x%') use an index
+            models.Index(Collate('tx_ref', 'NOCASE'), name='transaction_tx_ref_ci_idx'),
+            models.Index(Collate('flw_transaction_id', 'NOCASE'), name='transaction_flw_id_ci_idx'),
+        ]
+
+class CustomerOrderSummary(models.Model):
+    # Kept up to date by SoftBoyCrownApp.summaries as orders are placed and
+    # settled; `manage.py rebuild_order_summaries` recomputes it from Transactions
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='order_summary')
+    open_orders = models.PositiveIntegerField(default=0, help_text="Pending or processing")
+    approved_orders = models.PositiveIntegerField(default=0)
+    declined_orders = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Total of approved orders")
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.total_orders()} orders, {self.lifetime_spend} spent"
+
+    def total_orders(self):
+        return self.open_orders + self.approved_orders + self.declined_orders
+
+    class Meta:
+        verbose_name = 'Customer Order Summary'
+        verbose_name_plural = 'Customer Order Summaries'
+
+ROLLUP_STATUS_CHOICES = (
+    ('open', 'Open'),  # Pending or processing
+    ('approved', 'Approved'),
+    ('declined', 'Declined'),
+)
+
+
+class DailySales(models.Model):
+    # Orders placed on a day, by where they are now. Kept up to date by
+    # SoftBoyCrownApp.rollups; `manage.py rebuild_sales_rollups` recomputes it
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=ROLLUP_STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Order totals, shipping included")
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.orders} orders, {self.revenue}"
+
+    class Meta:
+        verbose_name = 'Daily Sales'
+        verbose_name_plural = 'Daily Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='daily_sales_unique'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    # The same, per product. category and the names are the product's when the
+    # row was first written, so reports don't need to join Product or Category
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    product_name = models.CharField(max_length=100, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_sales')
+    category_name = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=ROLLUP_STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Line totals")
+
+    def __str__(self):
+        return f"{self.date} {self.product_id} {self.status}: {self.units} units, {self.revenue}"
+
+    class Meta:
+        verbose_name = 'Daily Product Sales'
+        verbose_name_plural = 'Daily Product Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product', 'status'], name='daily_product_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'status', 'category'], name='daily_product_sales_cat_idx'),
+        ]
+
+class StockReservation(models.Model):
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} held for {self.transaction.tx_ref} until {self.expires_at}"
+
+    class Meta:
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        ordering = ['expires_at']
+        indexes = [
+            # Let the "units held right now" SUMs be answered from the index alone
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_product_idx'),
+            models.Index(fields=['variant', 'expires_at', 'quantity'], name='reservation_variant_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+class StockMovement(models.Model):
+    # Append-only history of stock changes, written by SoftBoyCrownApp.ledger.
+    # A row changes one counter: the product's in_stock when variant is
+    # empty, otherwise that variant's stock. Releases record holds that were
+    # let go and don't change either counter. Products and variants with
+    # history can't be deleted; set their stock to 0 instead.
+    KIND_CHOICES = (
+        ('sale', 'Sale'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+        ('release', 'Reservation release'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='stock_movements')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.PROTECT, null=True, blank=True, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField(help_text="Change to the counter; negative for stock going out")
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+} {self.product.name}"
+
+    class Meta:
+        verbose_name = 'Stock Movement'
+        verbose_name_plural = 'Stock Movements'
+        indexes = [
+            # Deltas since a snapshot: one counter, ids above its mark
+            models.Index(fields=['product', 'variant', 'id'], name='stock_movement_delta_idx'),
+            models.Index(fields=['created_at'], name='stock_movement_created_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    # Ledger balance of one counter including every movement up to
+    # last_movement_id. `manage.py snapshot_stock` adds a batch periodically.
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='stock_snapshots')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.PROTECT, null=True, blank=True, related_name='stock_snapshots')
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField(db_index=True)
+    taken_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity} at {self.taken_at}"
+
+    class Meta:
+        verbose_name = 'Stock Snapshot'
+        verbose_name_plural = 'Stock Snapshots'
+        indexes = [
+            models.Index(fields=['product', 'variant', 'taken_at'], name='stock_snapshot_lookup_idx'),
+        ]
+
+class WebhookEvent(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    )
+    event = models.CharField(max_length=50)
+    flw_transaction_id = models.CharField(max_length=100)
+    tx_ref = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event} {self.flw_transaction_id} ({self.tx_ref}) - {self.status}"
+
+    class Meta:
+        verbose_name = 'Webhook Event'
+        verbose_name_plural = 'Webhook Events'
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'flw_transaction_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at'], name='webhook_status_idx'),
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_due_idx'),
+        ]
+
+class WebhookJournalEntry(models.Model):
+    # Append-only record of every authenticated webhook request, kept as
+    # received so events can be replayed if recording or processing failed
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    remote_addr = models.GenericIPAddressField(null=True, blank=True)
+    body = models.BinaryField(help_text="zlib-compressed request body")
+    size = models.PositiveIntegerField(help_text="Uncompressed body size in bytes")
+
+    def __str__(self):
+        return f"Webhook received {self.received_at} from {self.remote_addr} ({self.size} bytes)"
+
+    def raw_body(self):
+        return zlib.decompress(self.body)
+
+    class Meta:
+        verbose_name = 'Webhook Journal Entry'
+        verbose_name_plural = 'Webhook Journal'
+        ordering = ['-received_at']
+
+class OutboundEmail(models.Model):
+    KIND_CHOICES = (
+        ('order_confirmation', 'Order confirmation'),
+        ('order_status', 'Order status update'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    transaction = models.ForeignKey('Transaction', on_delete=models.CASCADE, related_name='emails')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} to {self.to_email} - {self.status}"
+
+    class Meta:
+        verbose_name = 'Outbound Email'
+        verbose_name_plural = 'Outbound Emails'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_due_idx'),
+        ]
 
 class OrderItem(models.Model):
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='order_items')
@@ -228,6 +579,7 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     size = models.ForeignKey(Size, on_delete=models.SET_NULL, null=True, blank=True)
     color = models.ForeignKey(Color, on_delete=models.SET_NULL, null=True, blank=True)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Store price at time of purchase
 
     def __str__(self):
@@ -0,0 +1,358 @@
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from . import ledger, rollups
+from .emails import queue_email, queue_emails
+from .models import CartItem, OrderItem, Product, ProductVariant, StockReservation, Transaction
+from .shipping import get_shipping_fee
+from .summaries import order_placed, order_settled, rebuild_summaries
+
+OPEN_STATUSES = Transaction.OPEN_STATUSES
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product):
+        self.product = product
+        super().__init__(f"Insufficient stock for {product.name}.")
+
+
+def is_verified_payment(transaction, verification_response):
+    """Check a Flutterwave verify response against the amount we expect."""
+    data = verification_response.get('data') or {}
+    return (
+        verification_response.get('status') == 'success'
+        and data.get('status') in ['successful', 'completed']
+        and data.get('amount') == float(transaction.amount)
+        and data.get('currency') == 'NGN'
+    )
+
+
+def reserved_quantity(product, variant=None, exclude_user=None):
+    """Units of a product (or of one variant) held by checkouts that haven't expired."""
+    holds = StockReservation.objects.filter(expires_at__gt=timezone.now())
+    holds = holds.filter(variant=variant) if variant else holds.filter(product=product)
+    if exclude_user is not None:
+        # A buyer's own hold covers what is already in their cart
+        holds = holds.exclude(transaction__user=exclude_user)
+    return holds.aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def _held(field, ids, now):
+    rows = (
+        StockReservation.objects.filter(**{f'{field}__in': ids}, expires_at__gt=now)
+        .values(field).annotate(total=Sum('quantity')).values_list(field, 'total')
+    )
+    return dict(rows)
+
+
+def reserve_stock(transaction, cart_items):
+    """
+    Hold the cart quantities for ``transaction`` for STOCK_RESERVATION_TTL
+    seconds. Any earlier hold by the same buyer is released first, as a new
+    checkout replaces it. Raises InsufficientStock if stock other checkouts
+    are holding leaves too little for the cart.
+    """
+    now = timezone.now()
+    wanted_products = Counter()
+    wanted_variants = Counter()
+    for item in cart_items:
+        wanted_products[item.product_id] += item.quantity
+        if item.variant_id:
+            wanted_variants[item.variant_id] += item.quantity
+
+    with db_transaction.atomic():
+        ledger.release_holds(
+            StockReservation.objects.filter(transaction__user_id=transaction.user_id).exclude(transaction=transaction),
+            note="Replaced by a new checkout",
+        )
+
+        # Row locks serialise concurrent checkouts for the same products
+        # (a no-op on SQLite, where the write transaction already does)
+        stock = dict(Product.objects.select_for_update().filter(pk__in=wanted_products).values_list('pk', 'in_stock'))
+        variant_stock = dict(
+            ProductVariant.objects.select_for_update().filter(pk__in=wanted_variants).values_list('pk', 'stock')
+        )
+        held = _held('product_id', wanted_products, now)
+        variant_held = _held('variant_id', wanted_variants, now)
+
+        for item in cart_items:
+            if (
+                wanted_products[item.product_id] > stock.get(item.product_id, 0) - held.get(item.product_id, 0)
+                or (item.variant_id and wanted_variants[item.variant_id]
+                    > variant_stock.get(item.variant_id, 0) - variant_held.get(item.variant_id, 0))
+            ):
+                raise InsufficientStock(item.product)
+
+        expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                transaction=transaction,
+                product_id=item.product_id,
+                variant_id=item.variant_id,
+                quantity=item.quantity,
+                expires_at=expires_at,
+            )
+            for item in cart_items
+        ])
+
+
+def _order_item(transaction, cart_item):
+    return OrderItem(
+        transaction=transaction,
+        product=cart_item.product,
+        quantity=cart_item.quantity,
+        size_id=cart_item.size_id,
+        color_id=cart_item.color_id,
+        variant=cart_item.variant,
+        price=cart_item.unit_price(),  # Store the price at the time of purchase
+    )
+
+
+def place_order(user, cart_items, address, order_note=''):
+    """
+    Create a pending Transaction for the cart: the priced lines are copied
+    into OrderItems, the totals stored on the transaction and the stock
+    reserved. Later cart edits don't change the order. Raises
+    InsufficientStock (and creates nothing) if the stock is held elsewhere.
+    """
+    subtotal = sum(item.total_price() for item in cart_items)
+    shipping_fee = get_shipping_fee(address)
+    with db_transaction.atomic():
+        transaction = Transaction.objects.create(
+            user=user,
+            amount=subtotal + shipping_fee,
+            subtotal=subtotal,
+            shipping_fee=shipping_fee,
+            tx_ref=f"txn-{uuid.uuid4().hex[:10]}",
+            address=address,
+            order_note=order_note,
+            transaction_status='pending',
+        )
+        transaction.products.set({item.product_id for item in cart_items})
+        order_items = OrderItem.objects.bulk_create([_order_item(transaction, item) for item in cart_items])
+        reserve_stock(transaction, cart_items)
+        order_placed(transaction)
+        rollups.order_placed(transaction, order_items)
+    return transaction
+
+
+def release_expired_reservations(batch_size=1000):
+    """Delete expired holds in primary-key batches. Returns the number removed."""
+    removed = 0
+    while True:
+        with db_transaction.atomic():
+            batch = list(
+                StockReservation.objects.filter(expires_at__lte=timezone.now())
+                .values('pk', 'product_id', 'variant_id', 'quantity', 'transaction_id')[:batch_size]
+            )
+            if not batch:
+                return removed
+            removed += StockReservation.objects.filter(pk__in=[hold['pk'] for hold in batch]).delete()[0]
+            ledger.record_releases(batch, note="Expired")
+
+
+def _take_stock(item):
+    # Conditional UPDATEs so concurrent buyers can never push stock below zero
+    taken = Product.objects.filter(pk=item.product_id, in_stock__gte=item.quantity).update(
+        in_stock=F('in_stock') - item.quantity, updated_at=timezone.now(),
+    )
+    if taken and item.variant_id:
+        taken = ProductVariant.objects.filter(pk=item.variant_id, stock__gte=item.quantity).update(
+            stock=F('stock') - item.quantity,
+        )
+    if not taken:
+        raise InsufficientStock(item.product)
+
+
+def _clear_bought(transactions, order_items):
+    # Take what was bought out of the buyers' carts; lines added or topped up
+    # after checkout weren't part of the order, so they stay
+    buyers = {t.pk: t.user_id for t in transactions if t.user_id}
+    bought = Counter()
+    for item in order_items:
+        if item.transaction_id in buyers:
+            bought[buyers[item.transaction_id], item.product_id, item.variant_id, item.size_id, item.color_id] += item.quantity
+    cart_items = CartItem.objects.filter(cart__user_id__in=set(buyers.values())).values_list(
+        'pk', 'cart__user_id', 'product_id', 'variant_id', 'size_id', 'color_id', 'quantity',
+    ).order_by('pk')
+    emptied = []
+    for pk, *key, quantity in cart_items:
+        key = tuple(key)
+        taken = min(bought[key], quantity)
+        if not taken:
+            continue
+        bought[key] -= taken
+        if taken == quantity:
+            emptied.append(pk)
+        else:
+            CartItem.objects.filter(pk=pk).update(quantity=quantity - taken)
+    CartItem.objects.filter(pk__in=emptied).delete()
+
+
+def finalise_transaction(transaction, flw_transaction_id=None):
+    """
+    Approve a paid transaction: decrement stock for its OrderItems and take
+    them out of the buyer's cart in one database transaction.
+
+    Returns False if the transaction was already finalised by another
+    delivery. Raises InsufficientStock after declining the transaction if any
+    line can no longer be fulfilled; nothing else is changed in that case.
+    """
+    try:
+        with db_transaction.atomic():
+            # Claim the transaction first so duplicate deliveries become no-ops
+            claimed = Transaction.objects.filter(
+                pk=transaction.pk, transaction_status__in=OPEN_STATUSES,
+            ).update(transaction_status='approved', flw_transaction_id=flw_transaction_id)
+            if not claimed:
+                return False
+
+            order_items = list(transaction.order_items.select_related('product'))
+            if not order_items:
+                # Checked out before orders were snapshotted: fall back to the live cart
+                cart_items = CartItem.objects.filter(cart__user_id=transaction.user_id).select_related('product', 'variant')
+                order_items = OrderItem.objects.bulk_create([_order_item(transaction, item) for item in cart_items])
+                rollups.lines_added(order_items)
+            for item in order_items:
+                _take_stock(item)
+            ledger.record_sales(order_items)
+
+            _clear_bought([transaction], order_items)
+            StockReservation.objects.filter(transaction=transaction).delete()
+            order_settled(transaction, 'approved')
+            rollups.orders_settled([transaction], 'approved', order_items)
+            queue_email(transaction, 'order_confirmation')
+    except InsufficientStock:
+        decline_transaction(transaction, notify=True)
+        raise
+
+    transaction.transaction_status = 'approved'
+    transaction.flw_transaction_id = flw_transaction_id
+    return True
+
+
+def decline_transaction(transaction, notify=False):
+    """
+    Decline a transaction unless it has already been finalised. With
+    ``notify`` the customer is emailed about it.
+    """
+    with db_transaction.atomic():
+        declined = Transaction.objects.filter(
+            pk=transaction.pk, transaction_status__in=OPEN_STATUSES,
+        ).update(transaction_status='declined')
+        if declined:
+            transaction.transaction_status = 'declined'
+            ledger.release_holds(StockReservation.objects.filter(transaction=transaction), note="Order declined")
+            order_settled(transaction, 'declined')
+            rollups.orders_settled([transaction], 'declined')
+            if notify:
+                queue_email(transaction, 'order_status')
+    return bool(declined)
+
+
+def _subtract(model, field, taken, **extra):
+    # One UPDATE for every row touched: field = field - CASE pk WHEN ... END
+    if taken:
+        model.objects.filter(pk__in=taken).update(**{
+            field: F(field) - Case(*[When(pk=pk, then=quantity) for pk, quantity in taken.items()]),
+        }, **extra)
+
+
+def fulfil_transactions(transactions):
+    """
+    Approve many open transactions in one database transaction, as
+    finalise_transaction does for one: stock is decremented with one UPDATE
+    per table, legacy orders get their OrderItems in one INSERT, the bought
+    lines leave the carts, holds are cleared and the emails queued in bulk.
+
+    Transactions are served oldest first. One whose lines no longer fit in
+    the remaining stock is declined (and its customer told) instead, without
+    affecting the rest. Returns {transaction: outcome} with outcomes
+    'approved', 'insufficient stock' or 'already <status>'.
+    """
+    outcomes = {}
+    with db_transaction.atomic():
+        selected = list(
+            Transaction.objects.select_for_update().filter(pk__in=[t.pk for t in transactions])
+            .select_related('user').order_by('transaction_date', 'pk')
+        )
+        pending = [t for t in selected if t.transaction_status in OPEN_STATUSES]
+        for transaction in selected:
+            if transaction.transaction_status not in OPEN_STATUSES:
+                outcomes[transaction] = f"already {transaction.transaction_status}"
+        if not pending:
+            return outcomes
+
+        lines = {transaction.pk: [] for transaction in pending}
+        for item in OrderItem.objects.filter(transaction__in=pending).select_related('product'):
+            lines[item.transaction_id].append(item)
+        # Checked out before orders were snapshotted: fall back to the live cart
+        legacy = {t.user_id: t for t in reversed(pending) if not lines[t.pk] and t.user_id}
+        new_items = []
+        if legacy:
+            cart_items = CartItem.objects.filter(cart__user_id__in=legacy).select_related('cart', 'product', 'variant')
+            for cart_item in cart_items:
+                order_item = _order_item(legacy[cart_item.cart.user_id], cart_item)
+                lines[order_item.transaction.pk].append(order_item)
+                new_items.append(order_item)
+
+        all_lines = [item for items in lines.values() for item in items]
+        stock = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in={item.product_id for item in all_lines}).values_list('pk', 'in_stock')
+        )
+        variant_stock = dict(
+            ProductVariant.objects.select_for_update()
+            .filter(pk__in={item.variant_id for item in all_lines if item.variant_id}).values_list('pk', 'stock')
+        )
+        taken = Counter()
+        variant_taken = Counter()
+        approved, declined = [], []
+        for transaction in pending:
+            wanted = Counter()
+            variant_wanted = Counter()
+            for item in lines[transaction.pk]:
+                wanted[item.product_id] += item.quantity
+                if item.variant_id:
+                    variant_wanted[item.variant_id] += item.quantity
+            if (
+                any(quantity > stock.get(pk, 0) - taken[pk] for pk, quantity in wanted.items())
+                or any(quantity > variant_stock.get(pk, 0) - variant_taken[pk] for pk, quantity in variant_wanted.items())
+            ):
+                declined.append(transaction)
+                outcomes[transaction] = 'insufficient stock'
+                continue
+            taken.update(wanted)
+            variant_taken.update(variant_wanted)
+            approved.append(transaction)
+            outcomes[transaction] = 'approved'
+
+        Transaction.objects.filter(pk__in=[t.pk for t in approved]).update(transaction_status='approved')
+        Transaction.objects.filter(pk__in=[t.pk for t in declined]).update(transaction_status='declined')
+        _subtract(Product, 'in_stock', taken, updated_at=timezone.now())
+        _subtract(ProductVariant, 'stock', variant_taken)
+        added = OrderItem.objects.bulk_create([item for item in new_items if outcomes[item.transaction] == 'approved'])
+        rollups.lines_added(added)
+
+        ledger.record_sales([item for t in approved for item in lines[t.pk]])
+
+        _clear_bought(approved, [item for t in approved for item in lines[t.pk]])
+        StockReservation.objects.filter(transaction__in=approved).delete()
+        ledger.release_holds(StockReservation.objects.filter(transaction__in=declined), note="Order declined")
+        rebuild_summaries({t.user_id for t in pending if t.user_id})
+        rollups.orders_settled(approved, 'approved', [item for t in approved for item in lines[t.pk]])
+        rollups.orders_settled(declined, 'declined')
+        queue_emails(approved, 'order_confirmation')
+        queue_emails(declined, 'order_status')
+
+    for transaction in approved:
+        transaction.transaction_status = 'approved'
+    for transaction in declined:
+        transaction.transaction_status = 'declined'
+    return outcomes
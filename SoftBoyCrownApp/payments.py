@@ -0,0 +1,128 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """The payment gateway could not be reached or returned a server error."""
+
+
+class FlutterwaveClient:
+    """
+    Thin Flutterwave API client sharing one keep-alive session per process.
+
+    Connection errors, timeouts, 429s and 5xx responses are retried up to
+    ``max_retries`` times with jittered exponential backoff; anything else is
+    returned to the caller as parsed JSON.
+    """
+
+    def __init__(self, base_url, secret_key, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff=0.5, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key}',
+            'Content-Type': 'application/json',
+        })
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._counts = {'requests': 0, 'errors': 0, 'retries': 0}
+
+    def _record(self, elapsed, failed):
+        with self._lock:
+            self._latencies.append(elapsed)
+            self._counts['requests'] += 1
+            if failed:
+                self._counts['errors'] += 1
+
+    def _request(self, method, path, **kwargs):
+        url = f"{self.base_url}{path}"
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._lock:
+                    self._counts['retries'] += 1
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(time.perf_counter() - started, failed=True)
+                error = e
+                logger.warning("Flutterwave %s %s failed (attempt %d): %s", method, path, attempt + 1, e)
+                continue
+            elapsed = time.perf_counter() - started
+            if response.status_code == 429 or response.status_code >= 500:
+                self._record(elapsed, failed=True)
+                error = GatewayError(f"Flutterwave returned HTTP {response.status_code}")
+                logger.warning("Flutterwave %s %s returned %s (attempt %d)", method, path, response.status_code, attempt + 1)
+                continue
+            self._record(elapsed, failed=False)
+            try:
+                return response.json()
+            except ValueError as e:
+                raise GatewayError(f"Flutterwave returned a non-JSON response (HTTP {response.status_code})") from e
+        raise GatewayError(f"Flutterwave {method} {path} failed after {self.max_retries + 1} attempts: {error}") from error
+
+    def verify(self, transaction_id):
+        return self._request('GET', f"/v3/transactions/{transaction_id}/verify")
+
+    def verify_by_reference(self, tx_ref):
+        return self._request('GET', "/v3/transactions/verify_by_reference", params={'tx_ref': tx_ref})
+
+    def metrics(self):
+        """Request/error/retry counts and latency percentiles (in ms) for this process."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self._counts)
+        if latencies:
+            counts.update({
+                'p50_ms': latencies[len(latencies) // 2] * 1000,
+                'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+                'max_ms': latencies[-1] * 1000,
+            })
+        return counts
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                connect_timeout, read_timeout = settings.FLUTTERWAVE_TIMEOUT
+                _client = FlutterwaveClient(
+                    settings.FLUTTERWAVE_BASE_URL,
+                    settings.FLUTTERWAVE_SECRET_KEY,
+                    connect_timeout=connect_timeout,
+                    read_timeout=read_timeout,
+                    max_retries=settings.FLUTTERWAVE_MAX_RETRIES,
+                )
+    return _client
+
+
+def verify_transaction(transaction_id):
+    return get_client().verify(transaction_id)
+
+
+def verify_transaction_by_reference(tx_ref):
+    return get_client().verify_by_reference(tx_ref)
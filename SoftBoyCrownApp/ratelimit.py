@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Per-key token bucket held in process memory: each key may make ``rate``
+    requests per second on average, with bursts of up to ``burst``.
+
+    Counts are per process, so with several workers the effective limit is
+    multiplied by the worker count. That is fine for shedding floods cheaply;
+    it is not a quota.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            self._buckets[key] = (tokens, now)
+        return allowed
+
+    def _prune(self, now):
+        # Drop buckets that have refilled completely; they hold no state worth keeping
+        full_after = self.burst / self.rate
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
@@ -0,0 +1,191 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, Max, Min, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, DailySales, OrderItem, Product, Transaction
+
+REVENUE = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _bucket(status):
+    return 'open' if status in Transaction.OPEN_STATUSES else status
+
+
+def _lines(transactions, order_items):
+    if order_items is None:
+        return OrderItem.objects.filter(transaction__in=transactions).values_list(
+            'transaction_id', 'product_id', 'product__category_id', 'quantity', 'price',
+        )
+    return [
+        (item.transaction_id, item.product_id, item.product.category_id, item.quantity, item.price)
+        for item in order_items
+    ]
+
+
+class _Changes:
+    # Signed amounts to add to rollup rows, keyed like their unique constraints
+    def __init__(self):
+        self.daily = defaultdict(lambda: [0, 0, Decimal('0')])
+        self.products = defaultdict(lambda: [0, 0, Decimal('0')])
+        self.categories = {}
+
+    def add(self, transactions, status, sign, lines, count_orders=True):
+        days = {transaction.pk: timezone.localdate(transaction.transaction_date) for transaction in transactions}
+        if count_orders:
+            for transaction in transactions:
+                row = self.daily[days[transaction.pk], status]
+                row[0] += sign
+                row[2] += sign * transaction.amount
+        counted = set()
+        for transaction_id, product_id, category_id, quantity, price in lines:
+            day = days[transaction_id]
+            self.daily[day, status][1] += sign * quantity
+            row = self.products[day, product_id, status]
+            if (transaction_id, product_id) not in counted:
+                counted.add((transaction_id, product_id))
+                row[0] += sign
+            row[1] += sign * quantity
+            row[2] += sign * quantity * price
+            self.categories[product_id] = category_id
+
+    def save(self):
+        DailySales.objects.bulk_create(
+            [DailySales(date=day, status=status) for day, status in self.daily], ignore_conflicts=True,
+        )
+        for (day, status), (orders, units, revenue) in self.daily.items():
+            DailySales.objects.filter(date=day, status=status).update(
+                orders=F('orders') + orders, units=F('units') + units, revenue=F('revenue') + revenue,
+            )
+
+        names = {
+            pk: (name or '', category_name or '')
+            for pk, name, category_name in Product.objects.filter(pk__in=self.categories).values_list(
+                'pk', 'name', 'category__name',
+            )
+        }
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(
+                date=day, product_id=product_id, category_id=self.categories[product_id], status=status,
+                product_name=names[product_id][0], category_name=names[product_id][1],
+            )
+            for day, product_id, status in self.products
+        ], ignore_conflicts=True)
+        groups = defaultdict(dict)
+        for (day, product_id, status), values in self.products.items():
+            groups[day, status][product_id] = values
+        # One UPDATE per day and status, whatever the number of products
+        for (day, status), rows in groups.items():
+            DailyProductSales.objects.filter(date=day, status=status, product_id__in=rows).update(
+                orders=F('orders') + Case(*[When(product_id=pk, then=Value(v[0])) for pk, v in rows.items()]),
+                units=F('units') + Case(*[When(product_id=pk, then=Value(v[1])) for pk, v in rows.items()]),
+                revenue=F('revenue') + Case(
+                    *[When(product_id=pk, then=Value(v[2])) for pk, v in rows.items()], output_field=REVENUE,
+                ),
+            )
+
+
+def order_placed(transaction, order_items=None):
+    changes = _Changes()
+    changes.add([transaction], 'open', 1, _lines([transaction], order_items))
+    changes.save()
+
+
+def lines_added(order_items):
+    """
+    Count lines added to already-placed open orders (legacy checkouts). The
+    orders themselves were counted when placed.
+    """
+    if not order_items:
+        return
+    transactions = {item.transaction_id: item.transaction for item in order_items}
+    changes = _Changes()
+    changes.add(transactions.values(), 'open', 1, _lines(None, order_items), count_orders=False)
+    changes.save()
+
+
+def orders_settled(transactions, status, order_items=None):
+    """
+    Move open transactions to 'approved' or 'declined'. ``order_items`` can
+    pass their lines when already loaded.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return
+    lines = list(_lines(transactions, order_items))
+    changes = _Changes()
+    changes.add(transactions, 'open', -1, lines)
+    changes.add(transactions, _bucket(status), 1, lines)
+    changes.save()
+
+
+def rebuild_rollups(dates=None, batch_days=31):
+    """
+    Recompute the rollups from Transactions and OrderItems for the given
+    dates, or for every date with orders ``batch_days`` at a time.
+    Returns the number of days rebuilt.
+    """
+    if dates is not None:
+        for day in dates:
+            _rebuild_range(day, day + timedelta(days=1))
+        return len(dates)
+    bounds = Transaction.objects.aggregate(first=Min('transaction_date'), last=Max('transaction_date'))
+    if bounds['first'] is None:
+        return 0
+    day = timezone.localdate(bounds['first'])
+    last = timezone.localdate(bounds['last'])
+    rebuilt = 0
+    while day <= last:
+        end = min(day + timedelta(days=batch_days), last + timedelta(days=1))
+        _rebuild_range(day, end)
+        rebuilt += (end - day).days
+        day = end
+    return rebuilt
+
+
+def _bucket_expression(field):
+    return Case(When(**{f'{field}__in': Transaction.OPEN_STATUSES}, then=Value('open')), default=F(field))
+
+
+def _rebuild_range(start, end):
+    start_at = timezone.make_aware(datetime.combine(start, time.min))
+    end_at = timezone.make_aware(datetime.combine(end, time.min))
+    DailySales.objects.filter(date__gte=start, date__lt=end).delete()
+    DailyProductSales.objects.filter(date__gte=start, date__lt=end).delete()
+
+    transactions = Transaction.objects.filter(transaction_date__gte=start_at, transaction_date__lt=end_at).annotate(
+        day=TruncDate('transaction_date'), bucket=_bucket_expression('transaction_status'),
+    )
+    lines = OrderItem.objects.filter(
+        transaction__transaction_date__gte=start_at, transaction__transaction_date__lt=end_at,
+    ).annotate(
+        day=TruncDate('transaction__transaction_date'), bucket=_bucket_expression('transaction__transaction_status'),
+    )
+    units = {
+        (row['day'], row['bucket']): row['units']
+        for row in lines.values('day', 'bucket').annotate(units=Sum('quantity'))
+    }
+    DailySales.objects.bulk_create([
+        DailySales(
+            date=row['day'], status=row['bucket'], orders=row['orders'], revenue=row['revenue'],
+            units=units.get((row['day'], row['bucket'])) or 0,
+        )
+        for row in transactions.values('day', 'bucket').annotate(orders=Count('pk'), revenue=Sum('amount'))
+    ])
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(
+            date=row['day'], product_id=row['product_id'], category_id=row['product__category_id'],
+            product_name=row['product__name'] or '', category_name=row['product__category__name'] or '',
+            status=row['bucket'], orders=row['orders'], units=row['units'], revenue=row['revenue'],
+        )
+        for row in lines.values(
+            'day', 'product_id', 'product__category_id', 'product__name', 'product__category__name', 'bucket',
+        ).annotate(
+            orders=Count('transaction_id', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=REVENUE),
+        )
+    ], batch_size=1000)
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Run the tests with QUERY_BUDGET_RAISE on, so a view over budget fails them."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_budget = override_settings(QUERY_BUDGET_RAISE=True)
+        self._query_budget.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._query_budget.disable()
+        super().teardown_test_environment(**kwargs)
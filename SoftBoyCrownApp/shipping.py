@@ -0,0 +1,63 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import ShippingRate
+
+DEFAULT_ZONE = 'abuja'
+
+# Used until the ShippingRate table has rows (and as the seed for it)
+DEFAULT_RATES = {
+    'abuja': Decimal('2000'),
+    'nigeria': Decimal('5000'),
+    'international': Decimal('15000'),
+}
+
+ABUJA_STATES = frozenset(['abuja', 'federal capital territory', 'fct'])
+
+_lock = threading.Lock()
+_rates = None
+_loaded_at = 0.0
+
+
+def zone_for(country, state):
+    """Map a raw country/state pair to a shipping zone code."""
+    country = (country or '').strip().lower()
+    state = (state or '').strip().lower()
+    if country == 'nigeria':
+        return 'abuja' if state in ABUJA_STATES else 'nigeria'
+    return 'international'
+
+
+def _get_rates():
+    global _rates, _loaded_at
+    max_age = getattr(settings, 'SHIPPING_RATES_MAX_AGE', 300)
+    rates = _rates
+    if rates is None or time.monotonic() - _loaded_at > max_age:
+        with _lock:
+            if _rates is None or time.monotonic() - _loaded_at > max_age:
+                _rates = {**DEFAULT_RATES, **dict(ShippingRate.objects.values_list('zone', 'fee'))}
+                _loaded_at = time.monotonic()
+            rates = _rates
+    return rates
+
+
+def invalidate():
+    """Drop the cached rate table; the next lookup reloads it."""
+    global _rates
+    with _lock:
+        _rates = None
+
+
+def fee_for_zone(zone):
+    rates = _get_rates()
+    return rates.get(zone or DEFAULT_ZONE, rates[DEFAULT_ZONE])
+
+
+def get_shipping_fee(address=None):
+    """Shipping fee for an address, falling back to the Abuja rate when there is none."""
+    if address is None:
+        return fee_for_zone(DEFAULT_ZONE)
+    return fee_for_zone(address.shipping_zone)
@@ -0,0 +1,31 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import shipping
+from .models import ShippingRate
+
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+@receiver([post_save, post_delete], sender=ShippingRate)
+def invalidate_shipping_rates(sender, **kwargs):
+    shipping.invalidate()
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        value = str(value).strip()
+        if not value:
+            continue
+        if not PRAGMA_VALUE.match(value):
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS[{name!r}] is not a valid pragma value: {value!r}")
+        # On the raw connection, so these don't show up as queries in DEBUG
+        connection.connection.execute(f'PRAGMA {name} = {value}')
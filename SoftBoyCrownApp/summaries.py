@@ -0,0 +1,76 @@
+from django.db.models import Count, F, Max, Q, Sum
+
+from .models import CustomerOrderSummary, CustomUser, Transaction
+
+SUMMARY_FIELDS = ['open_orders', 'approved_orders', 'declined_orders', 'lifetime_spend', 'last_order_at']
+
+
+def _adjust(transaction, **changes):
+    # Called inside the transaction that changed the order. A missing row is
+    # built from scratch, which already includes the change.
+    if not transaction.user_id:
+        return
+    if not CustomerOrderSummary.objects.filter(user_id=transaction.user_id).update(**changes):
+        rebuild_summaries([transaction.user_id])
+
+
+def order_placed(transaction):
+    _adjust(transaction, open_orders=F('open_orders') + 1, last_order_at=transaction.transaction_date)
+
+
+def order_settled(transaction, status):
+    """Record an open transaction moving to 'approved' or 'declined'."""
+    if status == 'approved':
+        _adjust(
+            transaction,
+            open_orders=F('open_orders') - 1,
+            approved_orders=F('approved_orders') + 1,
+            lifetime_spend=F('lifetime_spend') + transaction.amount,
+        )
+    else:
+        _adjust(transaction, open_orders=F('open_orders') - 1, declined_orders=F('declined_orders') + 1)
+
+
+def rebuild_summaries(user_ids=None, batch_size=1000):
+    """
+    Recompute summaries from Transactions for the given users, or for every
+    user in primary-key batches. Returns the number of rows written.
+    """
+    if user_ids is not None:
+        return _rebuild_batch(list(user_ids))
+    written = 0
+    last_pk = 0
+    while True:
+        batch = list(CustomUser.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return written
+        last_pk = batch[-1]
+        written += _rebuild_batch(batch)
+
+
+def _rebuild_batch(user_ids):
+    totals = {
+        row['user_id']: row
+        for row in Transaction.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+            open_orders=Count('pk', filter=Q(transaction_status__in=Transaction.OPEN_STATUSES)),
+            approved_orders=Count('pk', filter=Q(transaction_status='approved')),
+            declined_orders=Count('pk', filter=Q(transaction_status='declined')),
+            lifetime_spend=Sum('amount', filter=Q(transaction_status='approved')),
+            last_order_at=Max('transaction_date'),
+        )
+    }
+    summaries = []
+    for user_id in user_ids:
+        row = totals.get(user_id, {})
+        summaries.append(CustomerOrderSummary(
+            user_id=user_id,
+            open_orders=row.get('open_orders', 0),
+            approved_orders=row.get('approved_orders', 0),
+            declined_orders=row.get('declined_orders', 0),
+            lifetime_spend=row.get('lifetime_spend') or 0,
+            last_order_at=row.get('last_order_at'),
+        ))
+    CustomerOrderSummary.objects.bulk_create(
+        summaries, update_conflicts=True, unique_fields=['user'], update_fields=SUMMARY_FIELDS,
+    )
+    return len(summaries)
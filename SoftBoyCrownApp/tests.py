@@ -1,3 +1,796 @@
-from django.test import TestCase
+import os
+import re
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import ProtectedError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from .catalog import import_catalog
+from .checks import check_webhook_secret, require_webhook_secret
+from .emails import RETRY_BASE_DELAY, send_pending
+from .ledger import drift, record_changes, stock_level
+from .middleware import QueryBudgetExceeded
+from .models import (
+    Address,
+    Cart,
+    CartItem,
+    Category,
+    Color,
+    CustomerOrderSummary,
+    CustomUser,
+    DailyProductSales,
+    DailySales,
+    OrderItem,
+    OutboundEmail,
+    Product,
+    ProductImage,
+    ProductVariant,
+    Size,
+    StockMovement,
+    StockReservation,
+    Transaction,
+    WebhookEvent,
+    WebhookJournalEntry,
+)
+from .orders import (
+    InsufficientStock,
+    decline_transaction,
+    finalise_transaction,
+    fulfil_transactions,
+    place_order,
+    release_expired_reservations,
+)
+from .payments import GatewayError
+from .webhooks import process_event, process_pending, record_webhook
+
+
+class FinaliseTransactionConcurrencyTests(TransactionTestCase):
+    stock = 5
+    buyers = 20
+
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=self.stock, description='Tee')
+        self.variant = ProductVariant.objects.create(product=self.product, size=Size.objects.create(name='M'), stock=self.stock)
+        self.transactions = []
+        for i in range(self.buyers):
+            user = CustomUser.objects.create(username=f'buyer{i}', email=f'buyer{i}@example.com', phone_number=str(i))
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.product, variant=self.variant, size=self.variant.size, quantity=1)
+            transaction = Transaction.objects.create(user=user, amount=100, subtotal=100, shipping_fee=0, tx_ref=f'txn-{i}')
+            OrderItem.objects.create(
+                transaction=transaction, product=self.product, variant=self.variant, size=self.variant.size, quantity=1, price=100,
+            )
+            self.transactions.append(transaction)
+
+    def _finalise(self, transaction, barrier, outcomes):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    outcomes.append(finalise_transaction(transaction, f'flw-{transaction.pk}'))
+                    break
+                except InsufficientStock:
+                    outcomes.append('declined')
+                    break
+                except OperationalError:
+                    # SQLite's shared in-memory test database reports lock
+                    # contention immediately instead of waiting; just retry.
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_deliveries_never_oversell(self):
+        # Every transaction is delivered twice, like a webhook racing the redirect
+        deliveries = [tx for tx in self.transactions for _ in range(2)]
+        barrier = threading.Barrier(len(deliveries))
+        outcomes = []
+        threads = [
+            threading.Thread(target=self._finalise, args=(Transaction.objects.get(pk=tx.pk), barrier, outcomes))
+            for tx in deliveries
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 0)
+        self.assertEqual(self.variant.stock, 0)
+        self.assertEqual(outcomes.count(True), self.stock)
+        self.assertEqual(Transaction.objects.filter(transaction_status='approved').count(), self.stock)
+        self.assertEqual(Transaction.objects.filter(transaction_status='declined').count(), self.buyers - self.stock)
+        self.assertEqual(OrderItem.objects.filter(transaction__transaction_status='approved').count(), self.stock)
+        self.assertEqual(CartItem.objects.filter(cart__user__transactions__transaction_status='approved').count(), 0)
+
+
+class AddToCartWithoutVariantsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.size = Size.objects.create(name='XL')
+        self.color = Color.objects.create(name='Black')
+        Size.objects.create(name='S')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=5, description='Tee')
+        self.product.sizes.add(self.size)
+        self.product.colors.add(self.color)
+        self.url = reverse('add_to_cart', args=[self.product.pk])
+        self.ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+    def test_unknown_size_is_refused(self):
+        response = self.client.post(self.url, {'quantity': 1, 'size': 'NOTASIZE'}, **self.ajax)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {'quantity': 1, 'size': 'S'}, **self.ajax)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_offered_size_and_color_are_kept(self):
+        response = self.client.post(self.url, {'quantity': 2, 'size': 'xl', 'color': 'Black'}, **self.ajax)
+        self.assertEqual(response.status_code, 200)
+        item = CartItem.objects.get()
+        self.assertEqual((item.size, item.color, item.variant, item.quantity), (self.size, self.color, None, 2))
+
+
+def place_cart_order(user, product, quantity, variant=None):
+    """Check out a one-line cart for ``user`` the way the checkout view does."""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    cart.items.all().delete()
+    item = CartItem.objects.create(cart=cart, product=product, variant=variant, quantity=quantity)
+    return place_order(user, [item], None)
+
+
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=5, description='Tee')
+        self.user = CustomUser.objects.create(username='payer', email='payer@example.com')
+        self.transaction = place_cart_order(self.user, self.product, 2)
+        self.payload = {
+            'event': 'charge.completed',
+            'data': {'id': 4242, 'tx_ref': self.transaction.tx_ref, 'status': 'successful'},
+        }
+
+    def test_duplicate_deliveries_are_stored_once(self):
+        record_webhook(self.payload)
+        record_webhook(self.payload)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    @mock.patch('SoftBoyCrownApp.webhooks.verify_transaction')
+    def test_each_event_is_processed_once(self, verify):
+        verify.return_value = {
+            'status': 'success',
+            'data': {'status': 'successful', 'amount': float(self.transaction.amount), 'currency': 'NGN'},
+        }
+        record_webhook(self.payload)
+        record_webhook(self.payload)
+
+        self.assertEqual(process_pending(), 1)
+        self.assertEqual(process_pending(), 0)
+        event = WebhookEvent.objects.get()
+        self.assertFalse(process_event(event))  # Already claimed and processed
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('processed', 1))
+        verify.assert_called_once_with('4242')
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.transaction_status, 'approved')
+        self.assertEqual(self.transaction.flw_transaction_id, '4242')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 3)
+
+    @mock.patch('SoftBoyCrownApp.webhooks.verify_transaction')
+    def test_gateway_errors_back_off(self, verify):
+        verify.side_effect = GatewayError("Flutterwave is down")
+        record_webhook(self.payload)
+
+        call_command('process_webhooks', stdout=StringIO())
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('pending', 1))
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(process_pending(), 0)  # Not due yet
+        verify.assert_called_once()
+
+        verify.side_effect = None
+        verify.return_value = {
+            'status': 'success',
+            'data': {'status': 'successful', 'amount': float(self.transaction.amount), 'currency': 'NGN'},
+        }
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_pending(), 1)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('processed', 2))
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username='reader', email='reader@example.com')
+        self.transaction = Transaction.objects.create(user=user, amount=100, subtotal=100, shipping_fee=0, tx_ref='txn-mail')
+
+    def _queue(self, count=1):
+        return [
+            OutboundEmail.objects.create(
+                kind='order_status', transaction=self.transaction, to_email='reader@example.com',
+                subject=f'Update {i}', body='Your order changed', html_body='<p>Your order changed</p>',
+            )
+            for i in range(count)
+        ]
+
+    def test_due_emails_are_sent_and_marked(self):
+        email, = self._queue()
+        self.assertEqual(send_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 1))
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(send_pending(), (0, 0))
+
+    @mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=smtplib.SMTPException('down'))
+    def test_failures_back_off_exponentially(self, send_messages):
+        email, = self._queue()
+        delays = []
+        for attempt in range(1, 3):
+            started = timezone.now()
+            with self.assertLogs('SoftBoyCrownApp.emails', 'WARNING'):
+                self.assertEqual(send_pending(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', attempt, 'down'))
+            delays.append(email.next_attempt_at - started)
+            self.assertEqual(send_pending(), (0, 0))  # Not due yet
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertAlmostEqual(delays[0].total_seconds(), RETRY_BASE_DELAY.total_seconds(), delta=5)
+        self.assertAlmostEqual(delays[1].total_seconds(), 2 * RETRY_BASE_DELAY.total_seconds(), delta=5)
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend')
+    @mock.patch('django.core.mail.backends.smtp.smtplib.SMTP')
+    def test_batch_shares_one_smtp_session(self, smtp):
+        self._queue(3)
+        self.assertEqual(send_pending(), (3, 0))
+        self.assertEqual(smtp.call_count, 1)
+        self.assertEqual(smtp.return_value.sendmail.call_count, 3)
+        smtp.return_value.quit.assert_called_once()
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=3, description='Tee')
+        self.first = CustomUser.objects.create(username='first', email='first@example.com', phone_number='1')
+        self.second = CustomUser.objects.create(username='second', email='second@example.com', phone_number='2')
+
+    def test_held_stock_is_refused_to_other_buyers(self):
+        place_cart_order(self.first, self.product, 2)
+        with self.assertRaises(InsufficientStock):
+            place_cart_order(self.second, self.product, 2)
+        self.assertFalse(Transaction.objects.filter(user=self.second).exists())
+        place_cart_order(self.second, self.product, 1)
+
+    def test_expired_holds_are_released(self):
+        place_cart_order(self.first, self.product, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(StockMovement.objects.filter(kind='release').count(), 1)
+        place_cart_order(self.second, self.product, 3)
+
+    def test_finalising_consumes_the_hold(self):
+        transaction = place_cart_order(self.first, self.product, 2)
+        self.assertTrue(finalise_transaction(transaction, 'flw-1'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
+        with self.assertRaises(InsufficientStock):
+            place_cart_order(self.second, self.product, 2)
+        place_cart_order(self.second, self.product, 1)
+
+
+class VariantAdminStockTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=3, description='Tee')
+        self.medium = ProductVariant.objects.create(product=self.product, size=Size.objects.create(name='M'), stock=0)
+        self.large = ProductVariant.objects.create(product=self.product, size=Size.objects.create(name='L'), stock=3)
+        admin_user = CustomUser.objects.create(username='admin', is_staff=True, is_superuser=True, phone_number='3')
+        self.client.force_login(admin_user)
+
+    def test_restocking_a_variant_updates_the_product(self):
+        response = self.client.post(reverse('admin:SoftBoyCrownApp_productvariant_change', args=[self.medium.pk]), {
+            'product': self.product.pk, 'size': self.medium.size_id, 'color': '', 'stock': 4, 'price': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 7)
+        self.assertEqual(
+            list(StockMovement.objects.order_by('pk').values_list('variant_id', 'quantity')),
+            [(None, 4), (self.medium.pk, 4)],
+        )
+
+        buyer = CustomUser.objects.create(username='buyer', email='buyer@example.com', phone_number='1')
+        transaction = place_cart_order(buyer, self.product, 4, variant=self.medium)
+        finalise_transaction(transaction, 'flw-restocked')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 3)
+
+    def test_deleting_a_variant_updates_the_product(self):
+        response = self.client.post(
+            reverse('admin:SoftBoyCrownApp_productvariant_delete', args=[self.large.pk]), {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 0)
+
+    def test_variants_with_stock_history_cannot_be_deleted(self):
+        ProductVariant.objects.filter(pk=self.medium.pk).update(stock=2)
+        record_changes({(self.product.pk, self.medium.pk): 0}, kind='restock')
+        response = self.client.post(
+            reverse('admin:SoftBoyCrownApp_productvariant_delete', args=[self.medium.pk]), {'post': 'yes'},
+        )
+        self.assertContains(response, 'Cannot delete Product Variant')
+        with self.assertRaises(ProtectedError):
+            Product.objects.filter(pk=self.product.pk).delete()
+        self.assertTrue(ProductVariant.objects.filter(pk=self.medium.pk).exists())
+        self.assertEqual(StockMovement.objects.filter(variant=self.medium).count(), 1)
+
+
+class AddressAdminSearchTests(TestCase):
+    def setUp(self):
+        Address.objects.create(full_name='Ada Obi', street='12 Allen Avenue', city='Ikeja', state='Lagos', country='Nigeria')
+        Address.objects.create(full_name='Tunde Bello', street='4 Aminu Kano Crescent', city='Wuse', state='FCT', country='Nigeria')
+        admin_user = CustomUser.objects.create(username='admin', is_staff=True, is_superuser=True, phone_number='3')
+        self.client.force_login(admin_user)
+
+    def _search(self, term):
+        response = self.client.get(reverse('admin:SoftBoyCrownApp_address_changelist'), {'q': term})
+        return sorted(address.full_name for address in response.context['cl'].result_list)
+
+    def test_search(self):
+        self.assertEqual(self._search('ada'), ['Ada Obi'])  # Name prefix
+        self.assertEqual(self._search('ike'), ['Ada Obi'])  # City prefix
+        self.assertEqual(self._search('allen'), ['Ada Obi'])  # Anywhere in the street
+        self.assertEqual(self._search('fct'), ['Tunde Bello'])
+        self.assertEqual(self._search('nigeria'), ['Ada Obi', 'Tunde Bello'])
+
+
+class AdminDeclineTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=5, description='Tee')
+        buyer = CustomUser.objects.create(username='buyer', email='buyer@example.com', phone_number='1')
+        other = CustomUser.objects.create(username='other', email='other@example.com', phone_number='2')
+        self.open = place_cart_order(buyer, self.product, 2)
+        self.approved = place_cart_order(other, self.product, 1)
+        finalise_transaction(self.approved, 'flw-approved')
+        admin_user = CustomUser.objects.create(username='admin', is_staff=True, is_superuser=True, phone_number='3')
+        self.client.force_login(admin_user)
+
+    def test_decline_releases_holds_and_skips_approved(self):
+        response = self.client.post(reverse('admin:SoftBoyCrownApp_transaction_changelist'), {
+            'action': 'decline_transactions',
+            '_selected_action': [self.open.pk, self.approved.pk],
+        }, follow=True)
+        self.assertContains(response, 'Declined 1 transaction(s).')
+        self.assertContains(response, f'Skipped, no longer open: {self.approved.tx_ref} (approved)')
+
+        self.open.refresh_from_db()
+        self.approved.refresh_from_db()
+        self.assertEqual(self.open.transaction_status, 'declined')
+        self.assertEqual(self.approved.transaction_status, 'approved')
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertTrue(StockMovement.objects.filter(kind='release', transaction=self.open, quantity=2).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.in_stock, 4)
+
+
+class WebhookSecretCheckTests(TestCase):
+    @override_settings(FLUTTERWAVE_SECRET_HASH='')
+    def test_missing_secret_warns(self):
+        self.assertEqual([error.id for error in check_webhook_secret(None)], ['SoftBoyCrownApp.W001'])
+
+    @override_settings(FLUTTERWAVE_SECRET_HASH='', DEBUG=False)
+    def test_missing_secret_stops_startup_without_debug(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'FLUTTERWAVE_SECRET_HASH is not set'):
+            require_webhook_secret()
+
+    @override_settings(FLUTTERWAVE_SECRET_HASH='hook-secret', DEBUG=False)
+    def test_configured_secret(self):
+        self.assertEqual(check_webhook_secret(None), [])
+        require_webhook_secret()
+
+
+@override_settings(FLUTTERWAVE_SECRET_HASH='hook-secret')
+class WebhookRejectionTests(TestCase):
+    def setUp(self):
+        self.url = reverse('payment_callback')
+        self.body = '{"event": "charge.completed", "data": {"id": 7, "tx_ref": "txn-hook", "status": "successful"}}'
+
+    def post(self, body, **headers):
+        return self.client.post(self.url, body, content_type='application/json', **headers)
+
+    def test_rate_limited_requests_skip_the_database(self):
+        with mock.patch('SoftBoyCrownApp.views.webhook_rate_limiter.allow', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.post(self.body, HTTP_VERIF_HASH='hook-secret')
+        self.assertEqual(response.status_code, 429)
+
+    def test_bad_signatures_skip_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.post(self.body, HTTP_VERIF_HASH='wrong')
+        self.assertEqual(response.status_code, 401)
+
+    def test_unparseable_bodies_skip_the_database(self):
+        with self.assertLogs('SoftBoyCrownApp.views', 'WARNING'), self.assertNumQueries(0):
+            response = self.post('{"event": "charge.completed", "data": ', HTTP_VERIF_HASH='hook-secret')
+        self.assertEqual(response.status_code, 400)
+
+    def test_valid_webhooks_are_journalled_and_queued(self):
+        response = self.post(self.body, HTTP_VERIF_HASH='hook-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebhookJournalEntry.objects.count(), 1)
+        self.assertEqual(WebhookEvent.objects.get().tx_ref, 'txn-hook')
+
+
+class IncrementalMatchesRebuildTests(TestCase):
+    """The incrementally maintained tables agree with a rebuild from the orders."""
+
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.product = Product.objects.create(name='Tee', price=100, category=category, in_stock=10, description='Tee')
+        self.variant = ProductVariant.objects.create(product=self.product, size=Size.objects.create(name='M'), stock=10)
+        record_changes({(self.product.pk, None): 0, (self.product.pk, self.variant.pk): 0}, kind='restock')
+        buyers = [
+            CustomUser.objects.create(username=f'buyer{i}', email=f'buyer{i}@example.com', phone_number=str(i))
+            for i in range(3)
+        ]
+        sold = place_cart_order(buyers[0], self.product, 2, self.variant)
+        finalise_transaction(sold, 'flw-sold')
+        declined = place_cart_order(buyers[1], self.product, 1, self.variant)
+        decline_transaction(declined)
+        place_cart_order(buyers[2], self.product, 3)  # Still open
+
+    def test_order_summaries(self):
+        fields = ['user_id', 'open_orders', 'approved_orders', 'declined_orders', 'lifetime_spend', 'last_order_at']
+        incremental = list(CustomerOrderSummary.objects.order_by('user_id').values_list(*fields))
+        self.assertEqual(len(incremental), 3)
+        call_command('rebuild_order_summaries', stdout=StringIO())
+        rebuilt = list(CustomerOrderSummary.objects.exclude(last_order_at=None).order_by('user_id').values_list(*fields))
+        self.assertEqual(incremental, rebuilt)
+
+    def _rollups(self):
+        return (
+            list(DailySales.objects.order_by('date', 'status').values_list('date', 'status', 'orders', 'units', 'revenue')),
+            list(DailyProductSales.objects.order_by('date', 'product_id', 'status').values_list(
+                'date', 'product_id', 'product_name', 'category_id', 'category_name', 'status', 'orders', 'units', 'revenue',
+            )),
+        )
+
+    def test_sales_rollups(self):
+        incremental = self._rollups()
+        self.assertEqual(len(incremental[0]), 3)  # open, approved and declined
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(incremental, self._rollups())
+
+    def test_stock_ledger(self):
+        self.assertEqual(drift(), {})
+        self.assertEqual(stock_level(self.product), 8)
+        self.assertEqual(stock_level(self.product, self.variant), 8)
+        call_command('snapshot_stock', stdout=StringIO())
+        self.assertEqual(drift(), {})
+        self.assertEqual(stock_level(self.product, self.variant), 8)
+        output = StringIO()
+        call_command('snapshot_stock', check=True, stdout=output)
+        self.assertIn('Live stock matches the ledger', output.getvalue())
+
+    def test_sales_dashboard_reads_only_rollups(self):
+        self.client.force_login(CustomUser.objects.create(username='admin', is_staff=True, is_superuser=True, phone_number='9'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:SoftBoyCrownApp_dailysales_changelist'))
+        self.assertContains(response, '<td>Tee</td>', html=False)
+        self.assertContains(response, 'T-Shirts')
+        for table in (Product._meta.db_table, Category._meta.db_table):
+            self.assertFalse([q['sql'] for q in queries.captured_queries if f'"{table}"' in q['sql']])
+
+
+class PaidCartTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        self.tee = Product.objects.create(name='Tee', price=100, category=category, in_stock=10, description='Tee')
+        self.cap = Product.objects.create(name='Cap', price=50, category=category, in_stock=10, description='Cap')
+        self.user = CustomUser.objects.create(username='buyer', email='buyer@example.com', phone_number='1')
+
+    def _cart_after_paying(self, pay):
+        transaction = place_cart_order(self.user, self.tee, 2)
+        cart = Cart.objects.get(user=self.user)
+        CartItem.objects.filter(cart=cart).update(quantity=3)  # Topped up after checkout
+        CartItem.objects.create(cart=cart, product=self.cap, quantity=1)
+        pay(transaction)
+        return sorted(cart.items.values_list('product__name', 'quantity'))
+
+    def test_finalise_keeps_lines_added_after_checkout(self):
+        self.assertEqual(self._cart_after_paying(finalise_transaction), [('Cap', 1), ('Tee', 1)])
+
+    def test_fulfil_keeps_lines_added_after_checkout(self):
+        self.assertEqual(self._cart_after_paying(lambda t: fulfil_transactions([t])), [('Cap', 1), ('Tee', 1)])
+
+
+class FulfilTransactionsTests(TestCase):
+    def _scenario(self, label):
+        category = Category.objects.create(name=f'T-Shirts {label}')
+        tee = Product.objects.create(name=f'Tee {label}', price=100, category=category, in_stock=5, description='Tee')
+        cap = Product.objects.create(name=f'Cap {label}', price=50, category=category, in_stock=4, description='Cap')
+        medium = ProductVariant.objects.create(product=tee, size=Size.objects.get_or_create(name='M')[0], stock=3)
+        large = ProductVariant.objects.create(product=tee, size=Size.objects.get_or_create(name='L')[0], stock=2)
+        orders = [
+            [(tee, medium, 2), (cap, None, 1)],
+            [(tee, large, 2)],
+            [(tee, medium, 2)],  # Only one medium left by now
+            [(cap, None, 3)],
+        ]
+        transactions = []
+        for i, lines in enumerate(orders + [[(cap, None, 1)]]):
+            user = CustomUser.objects.create(username=f'{label}{i}', email=f'{label}{i}@example.com', phone_number=f'{label}{i}')
+            transaction = Transaction.objects.create(
+                user=user, amount=0, subtotal=0, shipping_fee=0, tx_ref=f'txn-{label}-{i}',
+                transaction_status='pending' if i < len(orders) else 'approved',
+            )
+            for product, variant, quantity in lines:
+                OrderItem.objects.create(
+                    transaction=transaction, product=product, variant=variant, quantity=quantity, price=product.price,
+                )
+            transactions.append(transaction)
+        return [tee, cap, medium, large], transactions
+
+    def _stock(self, products):
+        tee, cap, medium, large = products
+        return [
+            Product.objects.get(pk=tee.pk).in_stock,
+            Product.objects.get(pk=cap.pk).in_stock,
+            ProductVariant.objects.get(pk=medium.pk).stock,
+            ProductVariant.objects.get(pk=large.pk).stock,
+        ]
+
+    def test_mixed_batch(self):
+        products, transactions = self._scenario('batch')
+        outcomes = fulfil_transactions(transactions)
+        self.assertEqual([outcomes[t] for t in transactions], [
+            'approved', 'approved', 'insufficient stock', 'approved', 'already approved',
+        ])
+        self.assertEqual(
+            list(Transaction.objects.filter(pk__in=[t.pk for t in transactions]).order_by('pk')
+                 .values_list('transaction_status', flat=True)),
+            ['approved', 'approved', 'declined', 'approved', 'approved'],
+        )
+        self.assertEqual(self._stock(products), [1, 0, 1, 0])
+
+    def test_batch_matches_finalising_one_by_one(self):
+        batch_products, batch = self._scenario('batch')
+        fulfil_transactions(batch)
+        single_products, singles = self._scenario('single')
+        for transaction in singles:
+            try:
+                finalise_transaction(transaction)
+            except InsufficientStock:
+                pass
+        self.assertEqual(self._stock(batch_products), self._stock(single_products))
+        self.assertEqual(
+            [t.transaction_status for t in Transaction.objects.filter(pk__in=[t.pk for t in batch]).order_by('pk')],
+            [t.transaction_status for t in Transaction.objects.filter(pk__in=[t.pk for t in singles]).order_by('pk')],
+        )
+
+
+class OrderDetailQueryCountTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='T-Shirts')
+        self.size = Size.objects.create(name='M')
+        self.color = Color.objects.create(name='Black')
+        self.user = CustomUser.objects.create(username='buyer', email='buyer@example.com')
+        self.order = Transaction.objects.create(user=self.user, amount=0, subtotal=0, shipping_fee=0, tx_ref='txn-detail')
+        self.client.force_login(self.user)
+
+    def _add_lines(self, count):
+        for i in range(count):
+            product = Product.objects.create(name=f'Tee {i}', price=100, category=self.category, in_stock=5, description='Tee')
+            ProductImage.objects.create(product=product, image=f'product_images/tee-{i}.jpg')
+            ProductImage.objects.create(product=product, image=f'product_images/tee-{i}-back.jpg')
+            variant = ProductVariant.objects.create(product=product, size=self.size, color=self.color, stock=5)
+            OrderItem.objects.create(
+                transaction=self.order, product=product, variant=variant, size=self.size, color=self.color, quantity=1, price=100,
+            )
+
+    def test_query_count_does_not_grow_with_order_lines(self):
+        url = reverse('order_detail', args=[self.order.pk])
+        self._add_lines(1)
+        with CaptureQueriesContext(connection) as one_line:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self._add_lines(20)
+        with self.assertNumQueries(len(one_line)):
+            response = self.client.get(url)
+        self.assertContains(response, 'Tee 19')
+        first_image = ProductImage.objects.filter(product__name='Tee 19').order_by('pk').first()
+        self.assertContains(response, f'http://testserver{first_image.image.url}')
+
+
+HOT_TABLES = {
+    model._meta.db_table for model in (Cart, CartItem, OrderItem, Product, ProductImage, ProductVariant, Transaction)
+}
+
+
+def full_table_scans(sql):
+    """Tables in HOT_TABLES that SQLite would read in full to run ``sql``."""
+    aliases = dict(re.findall(r'"(\w+)" (U\d+|T\d+|V\d+)\b', sql))
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+    scans = []
+    for detail in plan:
+        # "SCAN t" reads the whole table; "SCAN t USING INDEX i" walks an index in order
+        match = re.fullmatch(r'SCAN (\w+)', detail)
+        if match:
+            table = aliases.get(match.group(1), match.group(1))
+            if table in HOT_TABLES:
+                scans.append(table)
+    return scans
+
+
+@skipUnless(connection.vendor == 'sqlite', "Checks SQLite query plans")
+class HotQueryPlanTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='T-Shirts')
+        self.user = CustomUser.objects.create(username='shopper', email='shopper@example.com')
+        self.product = Product.objects.create(name='Tee', price=100, category=self.category, in_stock=5, description='Tee')
+        ProductImage.objects.create(product=self.product, image='product_images/tee.jpg')
+        Product.objects.create(name='Cap', price=50, category=self.category, in_stock=5, description='Cap')
+        order = Transaction.objects.create(user=self.user, amount=100, subtotal=100, shipping_fee=0, tx_ref='txn-plan')
+        OrderItem.objects.create(transaction=order, product=self.product, quantity=1, price=100)
+
+    def assertNoFullScans(self, url, login=False):
+        if login:
+            self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        offenders = [
+            f"{', '.join(scans)} in {query['sql']}"
+            for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and (scans := full_table_scans(query['sql']))
+        ]
+        self.assertEqual(offenders, [], f"Full table scans on {url}")
+
+    def test_shop(self):
+        self.assertNoFullScans(reverse('shop'))
+        self.assertNoFullScans(f"{reverse('shop')}?category={self.category.pk}")
+
+    def test_home(self):
+        self.assertNoFullScans(reverse('home'))
+
+    def test_product_detail(self):
+        self.assertNoFullScans(reverse('product_detail', args=[self.product.pk]))
+
+    def test_anonymous_cart(self):
+        self.client.get(reverse('home'))  # Creates the session
+        Cart.objects.create(session_key=self.client.session.session_key)
+        self.assertNoFullScans(reverse('cart'))
+
+    def test_profile(self):
+        self.assertNoFullScans(reverse('profile'), login=True)
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='T-Shirts')
+        Product.objects.create(name='Tee', price=100, category=category, in_stock=5, description='Tee')
+
+    def test_within_budget(self):
+        response = self.client.get(reverse('shop'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_BUDGET=1)
+    def test_over_budget_fails_in_tests(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'the budget is 1'):
+            self.client.get(reverse('shop'))
+
+    @override_settings(QUERY_BUDGET=1, QUERY_BUDGET_RAISE=False, DEBUG=True)
+    def test_over_budget_warns_in_debug(self):
+        with self.assertLogs('SoftBoyCrownApp.middleware', 'WARNING') as logs:
+            response = self.client.get(reverse('shop'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"GET {reverse('shop')} ran", logs.output[0])
+
+
+class ImportCatalogVariantTests(TestCase):
+    def _variants(self, sku):
+        return {
+            (variant.size and variant.size.name, variant.color and variant.color.name): variant.stock
+            for variant in ProductVariant.objects.filter(product__sku=sku).select_related('size', 'color')
+        }
+
+    def test_variants_carry_the_stock(self):
+        report = import_catalog([
+            {'sku': 'TEE', 'name': 'Tee', 'price': '100', 'variants': 'M/Black=3|L/Black=2'},
+            {'sku': 'CAP', 'name': 'Cap', 'price': '50', 'sizes': 'S|M', 'in_stock': '5'},
+            {'sku': 'MUG', 'name': 'Mug', 'price': '20', 'in_stock': '4'},
+            {'sku': 'BAD', 'name': 'Bad', 'price': '20', 'in_stock': '4', 'variants': 'M/=1'},
+        ], image_workers=1)
+        self.assertEqual(report['errors'], ["Row 4: in_stock (4) doesn't match the variant stock (1)"])
+        self.assertEqual(Product.objects.get(sku='TEE').in_stock, 5)
+        self.assertEqual(self._variants('TEE'), {('M', 'Black'): 3, ('L', 'Black'): 2})
+        self.assertEqual(set(Product.objects.get(sku='TEE').sizes.values_list('name', flat=True)), {'M', 'L'})
+        self.assertEqual(Product.objects.get(sku='CAP').in_stock, 5)
+        self.assertEqual(self._variants('CAP'), {('S', None): 3, ('M', None): 2})
+        self.assertEqual(self._variants('MUG'), {})
+        self.assertEqual(drift(), {})
+
+        medium = ProductVariant.objects.get(product__sku='TEE', size__name='M')
+        report = import_catalog([
+            {'sku': 'TEE', 'name': 'Tee', 'price': '100', 'variants': 'M/Black=1'},
+            {'sku': 'CAP', 'name': 'Cap', 'price': '50', 'in_stock': '5'},
+        ], image_workers=1)
+        self.assertEqual(report['emptied_variants'], 3)
+        self.assertEqual(Product.objects.get(sku='TEE').in_stock, 1)
+        self.assertEqual(self._variants('TEE'), {('M', 'Black'): 1, ('L', 'Black'): 0})
+        self.assertEqual(ProductVariant.objects.get(product__sku='TEE', size__name='M').pk, medium.pk)
+        self.assertEqual(Product.objects.get(sku='CAP').in_stock, 0)
+        self.assertEqual(self._variants('CAP'), {('S', None): 0, ('M', None): 0})
+        self.assertEqual(
+            StockMovement.objects.filter(variant__product__sku='TEE', variant__size__name='L').count(), 2,
+        )
+        self.assertEqual(drift(), {})
+
+
+class ImportCatalogImageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.images = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.addCleanup(self.images.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        png = BytesIO()
+        PILImage.new('RGB', (1, 1)).save(png, 'PNG')
+        with open(os.path.join(self.images.name, 'tee.png'), 'wb') as f:
+            f.write(png.getvalue())
+        with open(os.path.join(self.images.name, 'notes.png'), 'w') as f:
+            f.write('SECRET_KEY = "not an image"')
+
+    def _import(self, images, image_dir=None):
+        with self.assertLogs('SoftBoyCrownApp.catalog', 'WARNING'):
+            return import_catalog(
+                [{'sku': 'TEE', 'name': 'Tee', 'price': '100', 'images': images}], image_workers=1, image_dir=image_dir,
+            )
+
+    def test_local_images_only_from_the_image_dir(self):
+        report = self._import('tee.png|notes.png|../outside.png|/etc/passwd', image_dir=self.images.name)
+        self.assertEqual(report['images'], 1)
+        self.assertEqual(report['errors'], [
+            'Image notes.png: is not an image',
+            'Image ../outside.png: is outside the image directory',
+            'Image /etc/passwd: is outside the image directory',
+        ])
+        image = ProductImage.objects.get()
+        self.assertTrue(image.image.name.endswith('TEE-1.png'))
+
+    def test_admin_uploads_only_fetch_public_urls(self):
+        report = self._import('tee.png|file:///etc/passwd|http://127.0.0.1/tee.png')
+        self.assertEqual(report['images'], 0)
+        self.assertEqual([error.split(': ', 1)[1] for error in report['errors']], [
+            "local image paths are only read by `manage.py import_catalog` with an image directory",
+            "unsupported scheme 'file'",
+            "127.0.0.1 is not a public address",
+        ])
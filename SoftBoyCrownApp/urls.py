@@ -27,7 +27,7 @@ urlpatterns = [
     path('contact/', views.contact, name='contact'),
     # path('send/', views.send_newsletter, name='send_newsletter'),
     path('lookbook/', views.lookbook, name='lookbook'),
-    path('order/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('order/<int:transaction_id>/', views.order_detail),  # Old links
     # path('subscriber-count/', views.subscriber_count, name='subscriber_count'), path('generate-discount-code/', views.generate_discount_code, name='generate_discount_code'),
     # path('validate-discount-code/', views.validate_discount_code, name='validate_discount_code'),
     # path('newsletter-signup/', views.newsletter_signup, name='newsletter_signup'),
@@ -3,14 +3,27 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from .forms import RegisterForm , CheckoutForm, AddressForm
+from .payments import GatewayError, verify_transaction
+from .orders import (
+    InsufficientStock,
+    decline_transaction,
+    finalise_transaction,
+    is_verified_payment,
+    place_order,
+    reserved_quantity,
+)
+from .shipping import get_shipping_fee
+from .ratelimit import RateLimiter
+from .webhooks import has_valid_signature, journal_webhook, parse_webhook, record_webhook
 from django.contrib import messages
-from .models import Cart, CartItem, Product, Category,Transaction, Color, Size, ProductImage, HomePageImages, CustomUser, OrderItem,LookbookImage
+from .models import Cart, CartItem, CustomerOrderSummary, Product, ProductVariant, Category,Transaction, Color, Size, ProductImage, HomePageImages, CustomUser, OrderItem,LookbookImage
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 import uuid
-import requests
 from django.conf import settings
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.db.models import Prefetch, Q
 from django.core.mail import send_mass_mail
 from django.contrib.auth.forms import PasswordResetForm
 from django.template.loader import render_to_string
@@ -19,6 +32,9 @@ from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes
 from django.views.decorators.csrf import csrf_exempt
+import logging
+
+logger = logging.getLogger(__name__)
 
 def home(request):
     # Existing GET logic
@@ -177,14 +193,14 @@ def checkout(request):
     cart = None
     cart_items = []
     total_price = 0
-    shipping_fee = 2000  # Default shipping fee for Abuja
+    shipping_fee = get_shipping_fee()
     subtotal = 0
     address = None
     has_address = False
 
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.all()
+        cart_items = cart.items.select_related('product', 'variant')
         subtotal = sum(item.total_price() for item in cart_items)
         address = request.user.address if hasattr(request.user, 'address') and request.user.address else None
         has_address = address is not None and all([
@@ -198,15 +214,7 @@ def checkout(request):
 
         # Calculate shipping fee based on address
         if has_address:
-            country = address.country.lower() if address.country else ''
-            state = address.state.lower() if address.state else ''
-            if country == 'nigeria':
-                if state in ['abuja', 'federal capital territory', 'fct']:
-                    shipping_fee = 2000
-                else:
-                    shipping_fee = 5000
-            else:
-                shipping_fee = 15000
+            shipping_fee = get_shipping_fee(address)
             total_price = subtotal + shipping_fee
 
     except Cart.DoesNotExist:
@@ -224,31 +232,18 @@ def checkout(request):
                 messages.error(request, "Please save a delivery address before proceeding to payment.")
                 return redirect('checkout')
 
-            # Use existing address to calculate shipping
-            country = address.country.lower() if address.country else ''
-            state = address.state.lower() if address.state else ''
-            if country == 'nigeria':
-                if state in ['abuja', 'federal capital territory', 'fct']:
-                    shipping_fee = 2000
-                else:
-                    shipping_fee = 5000
-            else:
-                shipping_fee = 15000
-            total_price = subtotal + shipping_fee
+            # Make sure every selected size/color still has enough stock
+            for item in cart_items:
+                if item.quantity > item.available_stock():
+                    messages.error(request, f"Only {item.available_stock()} units of {item.product.name} are available.")
+                    return redirect('cart')
 
-            # Create transaction
-            tx_ref = f"txn-{uuid.uuid4().hex[:10]}"
-            order_note = request.POST.get('order_note', '')
-            transaction = Transaction.objects.create(
-                user=request.user,
-                amount=total_price,
-                tx_ref=tx_ref,
-                address=address,
-                order_note=order_note,
-                transaction_status='pending'
-            )
-            transaction.products.set([item.product for item in cart_items])
-            transaction.save()
+            # Snapshot the order and hold its stock while the customer pays
+            try:
+                transaction = place_order(request.user, list(cart_items), address, request.POST.get('order_note', ''))
+            except InsufficientStock as e:
+                messages.error(request, f"Sorry, the last units of {e.product.name} are being held by another customer. Please try again shortly.")
+                return redirect('cart')
             return redirect('initiate_payment', transaction_id=transaction.id)
         else:
             # Handle address form submission
@@ -260,15 +255,7 @@ def checkout(request):
                     request.user.save()
 
                 # Recalculate shipping fee based on new address
-                country = form.cleaned_data.get('country', '').lower()
-                state = form.cleaned_data.get('state', '').lower()
-                if country == 'nigeria':
-                    if state in ['abuja', 'federal capital territory', 'fct']:
-                        shipping_fee = 2000
-                    else:
-                        shipping_fee = 5000
-                else:
-                    shipping_fee = 15000
+                shipping_fee = get_shipping_fee(address)
                 total_price = subtotal + shipping_fee
 
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -319,73 +306,38 @@ def initiate_payment(request, transaction_id):
     }
     return render(request, 'SoftBoyCrownApp/initiate_payment.html', context)
 
-import json
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-# views.py
-@csrf_exempt
+# Webhooks are cheap to reject: rate limit and signature are checked before
+# anything touches the database
+webhook_rate_limiter = RateLimiter(*settings.WEBHOOK_RATE_LIMIT)
+
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def payment_callback(request):
     if request.method == "POST":
-        try:
-            webhook_data = json.loads(request.body.decode('utf-8'))
-            event_type = webhook_data.get('event')
-            transaction_data = webhook_data.get('data', {})
-            tx_ref = transaction_data.get('tx_ref')
-            transaction_id = transaction_data.get('id')
-            status = transaction_data.get('status')
-
-            try:
-                transaction = Transaction.objects.get(tx_ref=tx_ref)
-            except Transaction.DoesNotExist:
-                return HttpResponse(status=404)
-
-            if event_type == 'charge.completed' and status in ['successful', 'completed']:
-                verification_response = verify_transaction(transaction_id)
-                if (verification_response['status'] == 'success' and 
-                    verification_response['data']['status'] in ['successful', 'completed'] and
-                    verification_response['data']['amount'] == float(transaction.amount) and
-                    verification_response['data']['currency'] == 'NGN'):
-                    transaction.flw_transaction_id = transaction_id
-                    transaction.transaction_status = 'approved'
-                    transaction.save()
-                    cart, created = Cart.objects.get_or_create(user=transaction.user)
-                    cart_items = cart.items.all()
-                    
-                    # Create OrderItem objects for each CartItem
-                    for cart_item in cart_items:
-                        product = cart_item.product
-                        if product.in_stock >= cart_item.quantity:
-                            product.in_stock -= cart_item.quantity
-                            product.save()
-                            # Create an OrderItem for this cart item
-                            OrderItem.objects.create(
-                                transaction=transaction,
-                                product=product,
-                                quantity=cart_item.quantity,
-                                size=cart_item.size,
-                                color=cart_item.color,
-                                price=product.price  # Store the price at the time of purchase
-                            )
-                        else:
-                            transaction.transaction_status = 'declined'
-                            transaction.save()
-                            return HttpResponse(status=400)
-                    cart_items.delete()
-                    
-                    # Send order confirmation email with request
-                    send_order_confirmation_email(request, transaction)
-                    
-            elif status == 'failed':
-                transaction.transaction_status = 'declined'
-                transaction.save()
-            return HttpResponse(status=200)
-        except Exception as e:
-            print(f"Webhook error: {str(e)}")
+        if not webhook_rate_limiter.allow(request.META.get('REMOTE_ADDR')):
+            return HttpResponse(status=429)
+        if not has_valid_signature(request):
+            return HttpResponse(status=401)
+        webhook_data = parse_webhook(request.body)
+        if webhook_data is None:
+            # Turned away before touching the database; there is nothing in it to replay
+            logger.warning("Rejected malformed webhook from %s", request.META.get('REMOTE_ADDR'))
             return HttpResponse(status=400)
+        # Keep the raw body so it can be replayed whatever happens next
+        journal_webhook(request)
+        # Acknowledge straight away; the process_webhooks worker does the
+        # verification and stock work from the inbox.
+        try:
+            record_webhook(webhook_data)
+        except Exception:
+            # Flutterwave retries on 5xx, and the journal still has the body
+            logger.exception("Could not record webhook for %s", webhook_data['data']['tx_ref'])
+            return HttpResponse(status=500)
+        return HttpResponse(status=200)
 
     elif request.method == "GET":
         status = request.GET.get('status')
@@ -395,59 +347,35 @@ def payment_callback(request):
         if status in ['successful', 'completed']:
             try:
                 transaction = Transaction.objects.get(tx_ref=tx_ref)
-                verification_response = verify_transaction(transaction_id)
-                if (verification_response['status'] == 'success' and 
-                    verification_response['data']['status'] in ['successful', 'completed'] and
-                    verification_response['data']['amount'] == float(transaction.amount) and
-                    verification_response['data']['currency'] == 'NGN'):
-                    transaction.flw_transaction_id = transaction_id
-                    transaction.transaction_status = 'processing'
-                    transaction.save()
-                    cart, created = Cart.objects.get_or_create(user=transaction.user)
-                    cart_items = cart.items.all()
-                    
-                    # Create OrderItem objects for each CartItem
-                    for cart_item in cart_items:
-                        product = cart_item.product
-                        if product.in_stock >= cart_item.quantity:
-                            product.in_stock -= cart_item.quantity
-                            product.save()
-                            # Create an OrderItem for this cart item
-                            OrderItem.objects.create(
-                                transaction=transaction,
-                                product=product,
-                                quantity=cart_item.quantity,
-                                size=cart_item.size,
-                                color=cart_item.color,
-                                price=product.price  # Store the price at the time of purchase
-                            )
-                        else:
-                            transaction.transaction_status = 'declined'
-                            transaction.save()
-                            messages.error(request, f"Insufficient stock for {product.name}.")
-                            return redirect('cart')
-                    cart_items.delete()
-                    # Update transaction status to approved
-                    transaction.transaction_status = 'approved'
-                    transaction.save()
-                    
-                    # Send order confirmation email with request
-                    send_order_confirmation_email(request, transaction)
-                    
+                if transaction.transaction_status == 'approved':
+                    # Already finalised by the webhook
+                    return redirect('thank_you', transaction_id=transaction.id)
+                try:
+                    verification_response = verify_transaction(transaction_id)
+                except GatewayError:
+                    # Leave the transaction open; the webhook will settle it
+                    messages.warning(request, "We could not confirm your payment yet. Your order will be updated as soon as it is confirmed.")
+                    return redirect('profile')
+                if is_verified_payment(transaction, verification_response):
+                    try:
+                        # Also queues the confirmation email for the send_emails worker
+                        finalise_transaction(transaction, transaction_id)
+                    except InsufficientStock as e:
+                        messages.error(request, f"Insufficient stock for {e.product.name}.")
+                        return redirect('cart')
+
                     messages.success(request, "Payment successful! Your order is being processed. A confirmation email has been sent to your email address.")
                     return redirect('thank_you', transaction_id=transaction.id)  # Redirect to thank_you page
                 else:
                     print(f"Verification failed: {verification_response}")
-                    transaction.transaction_status = 'declined'
-                    transaction.save()
+                    decline_transaction(transaction)
                     messages.error(request, "Payment verification failed.")
             except Transaction.DoesNotExist:
                 messages.error(request, "Transaction not found.")
         elif status == 'cancelled':
             try:
                 transaction = Transaction.objects.get(tx_ref=tx_ref)
-                transaction.transaction_status = 'declined'
-                transaction.save()
+                decline_transaction(transaction)
                 messages.error(request, "Payment was cancelled.")
             except Transaction.DoesNotExist:
                 messages.error(request, "Transaction not found.")
@@ -456,163 +384,6 @@ def payment_callback(request):
 
         return redirect('cart')
     
-# def send_order_confirmation_email(request, transaction):
-#     subject = f'GOES Clothing - Order Confirmation'
-#     order_items = transaction.order_items.all()
-#     address = transaction.address
-#     address_text = f"{address.street}, {address.city}, {address.state}, {address.postal_code}, {address.country}"
-    
-#     # Calculate subtotal
-#     subtotal = sum(item.total_price() for item in order_items)
-#     # Calculate shipping fee
-#     shipping_fee = 2000
-#     if address:
-#         country = address.country.lower() if address.country else ''
-#         state = address.state.lower() if address.state else ''
-#         if country == 'nigeria':
-#             if state in ['abuja', 'federal capital territory', 'fct']:
-#                 shipping_fee = 2000
-#             else:
-#                 shipping_fee = 5000
-#         else:
-#             shipping_fee = 15000
-    
-#     # Calculate discount if applied
-#     discount_amount = 0
-#     discount_code_text = ''
-#     if transaction.discount_code:
-#         discount_amount = subtotal * (transaction.discount_code.discount_percentage / 100)
-#         discount_code_text = f"Discount Code Applied ({transaction.discount_code.code}): -₦{discount_amount}\n"
-
-#     text_content = f"""Dear {transaction.user.first_name} {transaction.user.last_name},
-
-# Thank you for your purchase from GOES!
-
-# Order Details:
-# Order Number: {transaction.id}
-# Date: {transaction.transaction_date.strftime('%Y-%m-%d %H:%M')}
-# Subtotal: ₦{subtotal}
-# {discount_code_text}Shipping Fee: ₦{shipping_fee}
-# Total Amount: ₦{transaction.amount}
-
-# Products:
-# {''.join([f"- {item.product.name} (Qty: {item.quantity}) - ₦{item.price}" for item in order_items])}
-
-# Shipping Address:
-# {address_text}
-
-# {'Order Note: ' + transaction.order_note if transaction.order_note else ''}
-
-# Your order is being processed and will be shipped soon.
-
-# Thank you for shopping with us!
-
-# GOES Team
-# God On Every Side
-# """
-    
-#     style_content = '''
-# <html>
-#     <head>
-#         <style>
-#             body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
-#             h2 { color: #000; border-bottom: 1px solid #ddd; padding-bottom: 10px; }
-#             .order-details { background-color: #f9f9f9; padding: 15px; border-radius: 5px; margin: 20px 0; }
-#             .product-item { margin-bottom: 15px; display: flex; align-items: center; }
-#             .product-image { width: 80px; height: 80px; margin-right: 15px; object-fit: cover; border-radius: 5px; }
-#             .product-info { flex: 1; }
-#             .footer { margin-top: 30px; font-size: 12px; color: #777; text-align: center; }
-#             .logo { text-align: center; margin-bottom: 20px; }
-#             .logo img { max-width: 150px; height: auto; }
-#             .button { display: inline-block; background-color: #000; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; }
-#             .button:hover { background-color: #333; }
-#             .total-amount { font-size: 18px; font-weight: bold; color: #000; background-color: #f0f0f0; padding: 10px; border-radius: 5px; text-align: center; margin: 15px 0; }
-#             .quantity { display: inline-block; background-color: #000; color: white; padding: 3px 8px; border-radius: 3px; margin-left: 5px; }
-#         </style>
-#     </head>
-#     <body>
-#         <div class="logo">
-#             <img src="https://www.godoneveryside.com/static/images/LOGO_20_TRANS[1].png" alt="GOES  Logo">
-#             <h1>GOD ON EVERY SIDE</h1>
-#         </div>
-# '''
-    
-#     product_items = []
-#     for item in order_items:
-#         product_image = ProductImage.objects.filter(product=item.product).first()
-#         image_url = ''
-#         if product_image and product_image.image:
-#             image_url = product_image.image.url
-#             if not image_url.startswith('http'):
-#                 image_url = request.build_absolute_uri(image_url)
-        
-#         size_text = f"Size: {item.size.name} | " if item.size else ""
-#         color_text = f"Color: {item.color.name} | " if item.color else ""
-        
-#         product_items.append(f"""
-#         <div class="product-item">
-#             <img src="{image_url}" alt="{item.product.name}" class="product-image">
-#             <div class="product-info">
-#                 <strong>{item.product.name}</strong> <span class="quantity">Qty: {item.quantity}</span><br>
-#                 {size_text}{color_text}₦{item.price}
-#             </div>
-#         </div>""")
-    
-#     product_list_html = '\n'.join(product_items)
-#     order_note_html = f'<h3>Order Note:</h3><p>{transaction.order_note}</p>' if transaction.order_note else ''
-#     discount_html = f'<p><strong>Discount ({transaction.discount_code.code}):</strong> -₦{discount_amount}</p>' if transaction.discount_code else ''
-    
-#     dynamic_content = (
-#         f"<h2>Order Confirmation</h2>\n"
-#         f"<p>Dear {transaction.user.first_name} {transaction.user.last_name},</p>\n"
-#         f"<p>Thank you for your purchase from GOES !</p>\n\n"
-        
-#         f"<div class=\"order-details\">\n"
-#         f"<h3>Order Details:</h3>\n"
-#         f"<p><strong>Order Number:</strong> {transaction.tx_ref}</p>\n"
-#         f"<p><strong>Date:</strong> {transaction.transaction_date.strftime('%Y-%m-%d %H:%M')}</p>\n"
-#         f"<p><strong>Subtotal:</strong> ₦{subtotal}</p>\n"
-#         f"{discount_html}\n"
-#         f"<p><strong>Shipping Fee:</strong> ₦{shipping_fee}</p>\n"
-#         f"<div class=\"total-amount\">Total Amount: ₦{transaction.amount}</div>\n\n"
-        
-#         f"<h3>Products:</h3>\n"
-#         f"{product_list_html}\n\n"
-        
-#         f"<h3>Shipping Address:</h3>\n"
-#         f"<p>{address_text}</p>\n\n"
-        
-#         f"{order_note_html}\n"
-#         f"</div>\n\n"
-        
-#         f"<p>Your order is being processed and will be shipped soon.</p>\n"
-#         f"<p>Thank you for shopping with us!</p>\n\n"
-        
-#         f"<div class=\"footer\">\n"
-#         f"<p><strong>GOES Team</strong></p>\n"
-#         f"<p>God On Every Side</p>\n"
-#         f"<p>© {time.strftime('%Y')} GOES. All rights reserved.</p>\n"
-#         f"</div>\n"
-#         f"</body>\n"
-#         "</html>"
-#     )
-    
-#     html_content = style_content + dynamic_content
-    
-#     try:
-#         email = EmailMultiAlternatives(
-#             subject=subject,
-#             body=text_content,
-#             from_email=settings.DEFAULT_FROM_EMAIL,
-#             to=[transaction.user.email]
-#         )
-#         email.attach_alternative(html_content, "text/html")
-#         email.send()
-#         return True
-#     except Exception as e:
-#         print(f"Failed to send order confirmation email: {str(e)}")
-#         return False
-                
 def thank_you(request, transaction_id):
     transaction = get_object_or_404(Transaction, id=transaction_id, user=request.user)
     categories = Category.objects.all()
@@ -628,16 +399,6 @@ def thank_you(request, transaction_id):
     }
     return render(request, 'SoftBoyCrownApp/thank_you.html', context)
 
-def verify_transaction(transaction_id):
-    url = f"https://api.flutterwave.com/v3/transactions/{transaction_id}/verify"
-    headers = {
-        'Authorization': f'Bearer {settings.FLUTTERWAVE_SECRET_KEY}',
-        'Content-Type': 'application/json',
-    }
-    response = requests.get(url, headers=headers)
-    return response.json()
-
-
 from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.shortcuts import get_object_or_404
@@ -656,23 +417,50 @@ def add_to_cart(request, product_id):
             return JsonResponse({'status': 'error', 'message': f"{product.name} is currently not available."}, status=400)
         return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
     
-    if product.in_stock <= 0:
+    quantity = int(request.POST.get('quantity', 1))
+    size_name = request.POST.get('size')
+    color_name = request.POST.get('color')
+
+    # Resolve the selected size/color to a single variant row
+    variant = ProductVariant.objects.resolve(product, size_name, color_name)
+    size = variant.size if variant else None
+    color = variant.color if variant else None
+    if variant is None and product.variants.exists():
+        messages.error(request, f"Selected size/color ({size_name or 'No size'}, {color_name or 'No color'}) is not available for {product.name}.")
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'status': 'error', 'message': f"Selected size/color ({size_name or 'No size'}, {color_name or 'No color'}) is not available for {product.name}."}, status=400)
+        return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
+    # Without variant rows the product's own sizes/colors apply, with stock kept on the product
+    if variant is None and size_name:
+        size = product.sizes.filter(name__iexact=size_name).first()
+        if size is None:
+            messages.error(request, f"Selected size {size_name} is not available for {product.name}.")
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'status': 'error', 'message': f"Selected size {size_name} is not available for {product.name}."}, status=400)
+            return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
+    if variant is None and color_name:
+        color = product.colors.filter(name__iexact=color_name).first()
+        if color is None:
+            messages.error(request, f"Selected color {color_name} is not available for {product.name}.")
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'status': 'error', 'message': f"Selected color {color_name} is not available for {product.name}."}, status=400)
+            return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
+    # Units held by other customers' checkouts can't be added to a cart
+    reserved = reserved_quantity(product, variant, exclude_user=request.user if request.user.is_authenticated else None)
+    available = (variant.stock if variant else product.in_stock) - reserved
+
+    if available <= 0:
         messages.error(request, f"{product.name} is out of stock.")
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'status': 'error', 'message': f"{product.name} is out of stock."}, status=400)
         return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
 
-    quantity = int(request.POST.get('quantity', 1))
-    
     # Check if requested quantity is available
-    if quantity > product.in_stock:
-        messages.error(request, f"Only {product.in_stock} units of {product.name} are available.")
+    if quantity > available:
+        messages.error(request, f"Only {available} units of {product.name} are available.")
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({'status': 'error', 'message': f"Only {product.in_stock} units of {product.name} are available."}, status=400)
+            return JsonResponse({'status': 'error', 'message': f"Only {available} units of {product.name} are available."}, status=400)
         return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
-        
-    size_name = request.POST.get('size')
-    color_name = request.POST.get('color')
 
     # If user is authenticated, fetch or create cart
     if request.user.is_authenticated:
@@ -684,50 +472,28 @@ def add_to_cart(request, product_id):
             session_key = request.session.session_key
         cart, created = Cart.objects.get_or_create(session_key=session_key, user=None)
 
-    # Get size and color objects if provided
-    size = None
-    color = None
-    if size_name:
-        size = get_object_or_404(Size, name__iexact=size_name)  # Case-insensitive match
-        if size not in product.sizes.all():
-            messages.error(request, f"Selected size {size_name} is not available for {product.name}.")
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'status': 'error', 'message': f"Selected size {size_name} is not available for {product.name}."}, status=400)
-            return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
-    if color_name:
-        try:
-            color = Color.objects.get(name__iexact=color_name)  # Case-insensitive match
-            if color not in product.colors.all():
-                messages.error(request, f"Selected color {color_name} is not available for {product.name}.")
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({'status': 'error', 'message': f"Selected color {color_name} is not available for {product.name}."}, status=400)
-                return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
-        except Color.DoesNotExist:
-            messages.error(request, f"Color {color_name} does not exist.")
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'status': 'error', 'message': f"Color {color_name} does not exist."}, status=400)
-            return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
-
     # Add or update cart item
     cart_item, created = CartItem.objects.get_or_create(
         cart=cart,
         product=product,
         size=size,
-        color=color
+        color=color,
+        defaults={'variant': variant},
     )
     
     # Check if the updated quantity would exceed available stock
     new_quantity = cart_item.quantity + quantity if not created else quantity
-    if new_quantity > product.in_stock:
-        messages.error(request, f"Cannot add {quantity} more units. Only {product.in_stock} units of {product.name} are available.")
+    if new_quantity > available:
+        messages.error(request, f"Cannot add {quantity} more units. Only {available} units of {product.name} are available.")
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return JsonResponse({'status': 'error', 'message': f"Cannot add {quantity} more units. Only {product.in_stock} units of {product.name} are available."}, status=400)
+            return JsonResponse({'status': 'error', 'message': f"Cannot add {quantity} more units. Only {available} units of {product.name} are available."}, status=400)
         return HttpResponseRedirect(reverse('product_detail', args=[product.id]))
         
     if not created:
         cart_item.quantity += quantity
     else:
         cart_item.quantity = quantity
+    cart_item.variant = variant
     cart_item.save()
 
     # Calculate updated cart count
@@ -773,10 +539,10 @@ def update_cart_item(request, item_id):
     # Check if requested quantity is valid
     if quantity < 1:
         return JsonResponse({'status': 'error', 'message': 'Quantity must be at least 1.'}, status=400)
-    if quantity > cart_item.product.in_stock:
+    if quantity > cart_item.available_stock():
         return JsonResponse({
             'status': 'error',
-            'message': f"Only {cart_item.product.in_stock} units of {cart_item.product.name} are available."
+            'message': f"Only {cart_item.available_stock()} units of {cart_item.product.name} are available."
         }, status=400)
 
     # Update quantity
@@ -786,18 +552,8 @@ def update_cart_item(request, item_id):
     # Calculate updated cart totals
     cart = cart_item.cart
     subtotal = sum(item.total_price() for item in cart.items.all())
-    shipping_fee = 2000  # Default for Abuja
-    if request.user.is_authenticated and hasattr(request.user, 'address') and request.user.address:
-        address = request.user.address
-        country = address.country.lower() if address.country else ''
-        state = address.state.lower() if address.state else ''
-        if country == 'nigeria':
-            if state in ['abuja', 'federal capital territory', 'fct']:
-                shipping_fee = 2000
-            else:
-                shipping_fee = 5000
-        else:
-            shipping_fee = 15000
+    address = request.user.address if request.user.is_authenticated else None
+    shipping_fee = get_shipping_fee(address)
     total_price = subtotal + shipping_fee
     cart_count = sum(item.quantity for item in cart.items.all())
 
@@ -819,18 +575,8 @@ def remove_from_cart(request, item_id):
 
     # Calculate updated cart totals
     subtotal = sum(item.total_price() for item in cart.items.all())
-    shipping_fee = 2000  # Default for Abuja
-    if request.user.is_authenticated and hasattr(request.user, 'address') and request.user.address:
-        address = request.user.address
-        country = address.country.lower() if address.country else ''
-        state = address.state.lower() if address.state else ''
-        if country == 'nigeria':
-            if state in ['abuja', 'federal capital territory', 'fct']:
-                shipping_fee = 2000
-            else:
-                shipping_fee = 5000
-        else:
-            shipping_fee = 15000
+    address = request.user.address if request.user.is_authenticated else None
+    shipping_fee = get_shipping_fee(address)
     total_price = subtotal + shipping_fee
     cart_count = sum(item.quantity for item in cart.items.all())
 
@@ -849,58 +595,33 @@ def remove_from_cart(request, item_id):
 
 @login_required(login_url='/login_user')
 def order_detail(request, transaction_id):
-    transaction = get_object_or_404(Transaction, id=transaction_id, user=request.user)
-    categories = Category.objects.all()
-    cart_count = 0
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart_count = cart.items.count()
+    order = get_object_or_404(Transaction.objects.select_related('address'), id=transaction_id, user=request.user)
+    cart_count = CartItem.objects.filter(cart__user=request.user).count()
+
+    # Lines with their product, size, color and variant in one query, and
+    # every product's images in one more
+    order_items = list(
+        order.order_items.select_related('product', 'size', 'color', 'variant').prefetch_related(
+            Prefetch('product__images', queryset=ProductImage.objects.order_by('pk'), to_attr='ordered_images')
+        )
+    )
 
-    # Get order items
-    order_items = transaction.order_items.all()
-    
-    # Calculate shipping fee based on address
-    shipping_fee = 2000  # Default shipping fee for Abuja
-    address = transaction.address
-    if address:
-        country = address.country.lower() if address.country else ''
-        state = address.state.lower() if address.state else ''
-        if country == 'nigeria':
-            if state in ['abuja', 'federal capital territory', 'fct']:
-                shipping_fee = 2000  # Abuja/FCT shipping fee
-            else:
-                shipping_fee = 5000  # Other Nigerian states
-        else:
-            shipping_fee = 15000  # International shipping fee
-    
-    # Calculate subtotal
-    subtotal = sum(item.total_price() for item in order_items)
-    
-    # Create product list with details
-    products_with_details = []
+    # Resolve the site root once rather than calling build_absolute_uri per line
+    base_url = request.build_absolute_uri('/')[:-1]
     for item in order_items:
-        product_image = ProductImage.objects.filter(product=item.product).first()
-        image_url = request.build_absolute_uri(product_image.image.url) if product_image and product_image.image else ''
-        products_with_details.append({
-            'product': item.product,
-            'quantity': item.quantity,
-            'image_url': image_url,
-            'size': item.size.name if item.size else '',
-            'color': item.color.name if item.color else '',
-            'price': item.price,  # Use the price stored in OrderItem
-        })
+        images = item.product.ordered_images
+        item.image_url = f"{base_url}{images[0].image.url}" if images else ''
 
     context = {
-        'transaction': transaction,
-        'categories': categories,
+        'order': order,
+        'order_items': order_items,
         'cart_count': cart_count,
-        'products_with_details': products_with_details,
-        'subtotal': subtotal,
-        'shipping_fee': shipping_fee,
-        'total_amount': transaction.amount,  # Already includes shipping
+        'current_year': timezone.now().year,
     }
     return render(request, 'SoftBoyCrownApp/order_detail.html', context)
 
+ORDERS_PER_PAGE = 10
+
 @login_required(login_url='/login_user')
 def profile(request):
     user = request.user
@@ -911,18 +632,31 @@ def profile(request):
         cart, created = Cart.objects.get_or_create(user=user)
         cart_count = cart.items.count()
 
-    # Fetch transactions
-    transactions = Transaction.objects.filter(user=user).order_by('-transaction_date')
-    
-    # Categorize transactions
-    current_orders = transactions.filter(transaction_status__in=['pending', 'processing', 'approved'])
-    past_orders = transactions.filter(transaction_status='declined')  # Add 'delivered' status in the future
+    # Fetch transactions with their stored lines in a fixed number of queries
+    transactions = Transaction.objects.filter(user=user).order_by('-transaction_date').prefetch_related(
+        Prefetch(
+            'order_items',
+            queryset=OrderItem.objects.select_related('product', 'size', 'color').prefetch_related(
+                Prefetch('product__images', queryset=ProductImage.objects.order_by('pk'), to_attr='ordered_images')
+            ),
+        ),
+        'products',  # Orders placed before their lines were stored
+    )
+
+    # Categorize transactions, one page of each at a time
+    current_orders = Paginator(
+        transactions.filter(transaction_status__in=['pending', 'processing', 'approved']), ORDERS_PER_PAGE,
+    ).get_page(request.GET.get('orders_page'))
+    past_orders = Paginator(
+        transactions.filter(transaction_status='declined'), ORDERS_PER_PAGE,  # Add 'delivered' status in the future
+    ).get_page(request.GET.get('past_page'))
 
     context = {
         'user': user,
         'address': address,
         'categories': categories,
         'cart_count': cart_count,
+        'order_summary': CustomerOrderSummary.objects.filter(user=user).first(),
         'current_orders': current_orders,
         'past_orders': past_orders,
     }
@@ -961,34 +695,21 @@ def cart(request):
     cart = None
     cart_items = []
     total_price = 0
-    shipping_fee = 2000  # Default shipping fee for Abuja in NGN
+    shipping_fee = get_shipping_fee()
     subtotal = 0
 
     try:
         if request.user.is_authenticated:
             cart = Cart.objects.get(user=request.user)
-            # Get user's address if available to calculate shipping
-            address = None
-            if hasattr(request.user, 'address') and request.user.address:
-                address = request.user.address
-                # Calculate shipping fee based on location
-                country = address.country.lower() if address.country else ''
-                state = address.state.lower() if address.state else ''
-                
-                if country == 'nigeria':
-                    if state == 'abuja' or state == 'federal capital territory' or state == 'fct':
-                        shipping_fee = 2000  # Abuja/FCT shipping fee
-                    else:
-                        shipping_fee = 5000  # Other Nigerian states shipping fee
-                else:
-                    shipping_fee = 15000  # International shipping fee
+            # Calculate shipping from the user's address if available
+            shipping_fee = get_shipping_fee(request.user.address)
         else:
             session_key = request.session.session_key
             if session_key:
                 cart = Cart.objects.get(session_key=session_key)
 
         if cart:
-            cart_items = cart.items.all()
+            cart_items = cart.items.select_related('product', 'variant')
             subtotal = sum(item.total_price() for item in cart_items)
             total_price = subtotal + shipping_fee
 
@@ -1140,8 +861,10 @@ def product_detail(request, product_id):
     # Get available sizes and colors
     available_sizes = product.sizes.all()
     available_colors = product.colors.all()
+    available_stock = max(product.in_stock - reserved_quantity(product), 0)
     context = {
         'product': product,
+        'available_stock': available_stock,
         'related_products': related_products,
         'categories': categories,
         'available_sizes': available_sizes,
@@ -1269,14 +992,3 @@ def contact(request):
     }
     return render(request, 'SoftBoyCrownApp/contact.html', context)
 
-
-@login_required
-def order_detail(request, order_id):
-    order = get_object_or_404(Transaction, id=order_id, user=request.user)
-    cart_count = request.user.cart.items.count() if request.user.cart else 0
-    context = {
-        'order': order,
-        'cart_count': cart_count,
-        'current_year': 2025,  # Adjust dynamically if needed
-    }
-    return render(request, 'SoftBoyCrownApp/order_detail.html', context)
@@ -0,0 +1,162 @@
+import hmac
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Transaction, WebhookEvent, WebhookJournalEntry
+from .orders import InsufficientStock, decline_transaction, finalise_transaction, is_verified_payment
+from .payments import verify_transaction
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies mid-event leaves it "processing"; reclaim it after this long
+LOCK_TIMEOUT = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+# A failed event waits RETRY_BASE_DELAY, then twice as long after each further failure
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+# Flutterwave payloads are a few KB; anything much bigger isn't one
+MAX_PAYLOAD_BYTES = 64 * 1024
+EVENT_TYPES = ('charge.completed',)
+
+
+def has_valid_signature(request):
+    """
+    Check the verif-hash header against FLUTTERWAVE_SECRET_HASH in constant
+    time. Always False while no secret hash is configured.
+    """
+    expected = settings.FLUTTERWAVE_SECRET_HASH
+    if not expected:
+        logger.error("FLUTTERWAVE_SECRET_HASH is not set; rejecting webhook")
+        return False
+    received = request.headers.get('verif-hash', '')
+    return hmac.compare_digest(received.encode('utf-8'), expected.encode('utf-8'))
+
+
+def parse_webhook(body):
+    """
+    Decode a webhook body and check it has the shape we process. Returns the
+    payload dict, or None if it is malformed.
+    """
+    if len(body) > MAX_PAYLOAD_BYTES:
+        return None
+    try:
+        webhook_data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(webhook_data, dict) or webhook_data.get('event') not in EVENT_TYPES:
+        return None
+    transaction_data = webhook_data.get('data')
+    if not isinstance(transaction_data, dict):
+        return None
+    transaction_id = transaction_data.get('id')
+    tx_ref = transaction_data.get('tx_ref')
+    if isinstance(transaction_id, bool) or not isinstance(transaction_id, (int, str)) or not str(transaction_id).isdigit():
+        return None
+    if not isinstance(tx_ref, str) or not 0 < len(tx_ref) <= 100:
+        return None
+    if not isinstance(transaction_data.get('status'), str):
+        return None
+    return webhook_data
+
+
+def journal_webhook(request):
+    """Append the raw request body to the webhook journal."""
+    body = request.body
+    return WebhookJournalEntry.objects.create(
+        remote_addr=request.META.get('REMOTE_ADDR') or None,
+        body=zlib.compress(body),
+        size=len(body),
+    )
+
+
+def record_webhooks(payloads):
+    """
+    Store webhooks that have passed parse_webhook in the inbox. Repeated
+    deliveries of the same event are ignored.
+    """
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            event=webhook_data['event'],
+            flw_transaction_id=str(webhook_data['data']['id']),
+            tx_ref=webhook_data['data']['tx_ref'],
+            payload=webhook_data,
+        )
+        for webhook_data in payloads
+    ], ignore_conflicts=True)
+
+
+def record_webhook(webhook_data):
+    record_webhooks([webhook_data])
+
+
+def _claim(event):
+    now = timezone.now()
+    return WebhookEvent.objects.filter(
+        Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', locked_at__lt=now - LOCK_TIMEOUT),
+        pk=event.pk,
+    ).update(status='processing', locked_at=now, attempts=F('attempts') + 1)
+
+
+def _handle(event):
+    transaction_data = event.payload.get('data') or {}
+    status = transaction_data.get('status')
+    transaction = Transaction.objects.get(tx_ref=event.tx_ref)
+
+    if event.event == 'charge.completed' and status in ['successful', 'completed']:
+        verification_response = verify_transaction(event.flw_transaction_id)
+        if is_verified_payment(transaction, verification_response):
+            try:
+                finalise_transaction(transaction, event.flw_transaction_id)
+            except InsufficientStock:
+                pass  # The transaction has been declined
+    elif status == 'failed':
+        decline_transaction(transaction)
+
+
+def _schedule_retry(event, error):
+    event.refresh_from_db(fields=['attempts'])
+    if event.attempts >= MAX_ATTEMPTS or isinstance(error, Transaction.DoesNotExist):
+        status, next_attempt_at = 'failed', timezone.now()
+    else:
+        status = 'pending'
+        next_attempt_at = timezone.now() + min(RETRY_BASE_DELAY * (2 ** (event.attempts - 1)), RETRY_MAX_DELAY)
+    WebhookEvent.objects.filter(pk=event.pk).update(
+        status=status, next_attempt_at=next_attempt_at, last_error=str(error), locked_at=None,
+    )
+
+
+def process_event(event):
+    """Process one inbox event. Returns False if another worker already has it."""
+    if not _claim(event):
+        return False
+    try:
+        _handle(event)
+    except Exception as e:
+        _schedule_retry(event, e)
+        return True
+    WebhookEvent.objects.filter(pk=event.pk).update(
+        status='processed', processed_at=timezone.now(), locked_at=None, last_error=None,
+    )
+    return True
+
+
+def process_pending(batch_size=100):
+    """
+    Process one batch of due inbox events, oldest first. Returns how many
+    were done with, processed or failed for good; events put off for a
+    retry don't count.
+    """
+    now = timezone.now()
+    events = list(
+        WebhookEvent.objects.filter(
+            Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', locked_at__lt=now - LOCK_TIMEOUT)
+        ).order_by('received_at')[:batch_size]
+    )
+    claimed = [event.pk for event in events if process_event(event)]
+    return WebhookEvent.objects.filter(pk__in=claimed).exclude(status='pending').count()
@@ -62,6 +62,7 @@ CKEDITOR_5_CONFIGS = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'SoftBoyCrownApp.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -95,13 +96,49 @@ WSGI_APPLICATION = 'SoftBoyCrownProject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+import os
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep each worker's connection open between requests rather than reconnecting
+        # (and re-running the pragmas below) every time; it is checked before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts. With the default
+            # (DEFERRED) a transaction that reads and then writes fails with
+            # "database is locked" if another writer got in first, whatever the busy timeout.
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+        },
     }
 }
 
+# PRAGMAs run on every new SQLite connection (see SoftBoyCrownApp/signals.py).
+# WAL lets readers carry on while a write commits and, with synchronous=NORMAL,
+# only fsyncs at checkpoints. Set a variable to an empty string to keep SQLite's
+# default for that pragma. `manage.py benchmark_sqlite` compares against no tuning.
+# WAL is stored in the database header, so the first command that connects
+# rewrites the committed sample db.sqlite3 (and creates the -wal/-shm files,
+# which are gitignored). Run with SQLITE_JOURNAL_MODE=delete to leave it as is.
+SQLITE_PRAGMAS = {
+    'busy_timeout': os.environ.get('SQLITE_BUSY_TIMEOUT', '5000'),  # ms to wait for a lock
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)),  # bytes
+    'cache_size': os.environ.get('SQLITE_CACHE_SIZE', '-20000'),  # negative: KiB
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'memory'),
+}
+
+# Most queries one request should need. Going over logs a warning in DEBUG and
+# fails the request when QUERY_BUDGET_RAISE is on, which the test runner below
+# always turns on (SoftBoyCrownApp.middleware). 0 turns it off.
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 50))
+QUERY_BUDGET_RAISE = os.environ.get('QUERY_BUDGET_RAISE', '') == '1'
+
+TEST_RUNNER = 'SoftBoyCrownApp.runner.QueryBudgetTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,8 +174,6 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
-import os
-
 STATIC_URL = 'static/'
 STATIC_FILES_DIR = os.path.join(BASE_DIR, 'static')
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
@@ -146,12 +181,46 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = 'img/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# The only directory `manage.py import_catalog` reads local image paths from
+# (relative to it); empty allows URLs only. The admin upload never reads local files.
+CATALOG_IMAGE_DIR = os.environ.get('CATALOG_IMAGE_DIR', '')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'SoftBoyCrownApp.CustomUser'
 
 FLUTTERWAVE_PUBLIC_KEY = "FLWPUBK_TEST-3a76f5e71c09047731ae06deb164171d-X"
 FLUTTERWAVE_SECRET_KEY = "FLWSECK_TEST-53987cf8a9750a2a52b2723f873f63e2-X"
+# Must match the "Secret hash" set on the Flutterwave dashboard; sent as verif-hash on webhooks.
+# Webhooks are rejected while it is empty, so the site refuses to start without it unless DEBUG is on.
+FLUTTERWAVE_SECRET_HASH = os.environ.get('FLUTTERWAVE_SECRET_HASH', '')
+# (requests per second, burst) allowed per client IP on the webhook endpoint
+WEBHOOK_RATE_LIMIT = (20, 100)
+
+# Point this at a local stand-in to load-test payments offline
+FLUTTERWAVE_BASE_URL = os.environ.get('FLUTTERWAVE_BASE_URL', 'https://api.flutterwave.com')
+FLUTTERWAVE_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+FLUTTERWAVE_MAX_RETRIES = 2
+
+# Used to build absolute links (e.g. product images) in emails sent outside a request
+SITE_URL = os.environ.get('SITE_URL', 'https://softboycrown.pythonanywhere.com')
+
+# Outgoing email is queued in OutboundEmail and sent by `manage.py send_emails`.
+# For a local SMTP sink: EMAIL_HOST=localhost EMAIL_PORT=1025
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Soft Boy Crown <no-reply@softboycrown.com>')
+
+# Seconds a process keeps its in-memory copy of the ShippingRate table.
+# Edits made in the same process invalidate it immediately.
+SHIPPING_RATES_MAX_AGE = 300
+
+# Seconds checkout holds the cart's stock for while the customer pays.
+# Expired holds stop counting straight away; `manage.py release_reservations` deletes them.
+STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 15 * 60))
 
 
 # Default primary key field type